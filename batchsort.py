@@ -0,0 +1,68 @@
+# batchsort.py
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Jonathan Miller
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import multiprocessing
+import pickle
+import bracket
+import getbracket
+
+def _sort_one(job):
+    item, vectorized, separate = job
+    
+    if isinstance(item, bracket.bracket):
+        b = item
+    elif isinstance(item, list):
+        b = bracket.from_seeds(item)
+    else:
+        b = getbracket.generate(*item)
+    
+    b.sort(vectorized, separate=separate)
+    return b
+
+def sort_all(items, processes=None, vectorized=False, separate=None):
+    """ Sort many brackets in parallel across a pool of processes, and return the sorted
+    brackets in the same order as the items. Brackets are sent to and from the workers in
+    the compact form given by bracket.__reduce__, so the brackets which are returned are 
+    sorted copies; the brackets which are passed in are left as they are.
+    
+    @items: a list of bracket objects, of lists of rankedElements to be built into brackets
+    with bracket.from_seeds(), or of (matchfile, participantfile) pairs to be loaded with 
+    getbracket.generate(). These can be mixed.
+    @processes: the number of worker processes. Defaults to the number of CPUs.
+    @vectorized: sort with NumPy, as in bracket.sort()
+    @separate: rules which keep ranked elements apart, as in bracket.sort()
+    
+    """
+    jobs = [(item, vectorized, separate) for item in items]
+    
+    if processes == 1 or len(jobs) < 2:
+        # copy the items as they would be sent to the workers, so they are left alone here too
+        return [_sort_one(job) for job in pickle.loads(pickle.dumps(jobs, 2))]
+    
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_sort_one, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,172 @@
+# benchmark.py
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Jonathan Miller
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Benchmarks for loading, sorting and iterating over brackets of increasing size.
+
+Brackets are generated from synthetic participants, so no network access is needed.
+Results are written as JSON, so that runs can be compared across versions.
+
+    $ python benchmark.py --sizes 8 64 512 --output results.json
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import bracket
+import getbracket
+
+SIZES = [8, 32, 100, 256, 1000, 4096, 16384, 65536]
+
+def _leaves(b):
+    return [e for e in b if isinstance(e, bracket.rankedElement)]
+
+def _set_ranks(leaves, ranks):
+    for e, rank in zip(leaves, ranks):
+        e.set_rank(rank)
+        e.name = str(rank)
+
+def layout_random(b):
+    """ Shuffle the ranks of a seeded bracket."""
+    leaves = _leaves(b)
+    ranks = [e.rank() for e in leaves]
+    random.shuffle(ranks)
+    _set_ranks(leaves, ranks)
+
+def layout_near_sorted(b):
+    """ Swap a small number of random pairs of participants in a seeded bracket."""
+    leaves = _leaves(b)
+    for i in range(max(1, len(leaves)//20)):
+        random.choice(leaves).swap(random.choice(leaves))
+
+def layout_adversarial(b):
+    """ Rank participants in the order they appear in the tree, so that neighbouring
+    ranks meet in the first round and the top ranks are packed into one side."""
+    leaves = _leaves(b)
+    _set_ranks(leaves, sorted(e.rank() for e in leaves))
+
+LAYOUTS = {
+    "random": layout_random,
+    "near-sorted": layout_near_sorted,
+    "adversarial": layout_adversarial,
+}
+
+def generate_bracket(num, layout):
+    """ Return a bracket of num participants with ranks 1 through num, arranged according
+    to the named layout."""
+    b = bracket.from_seeds([bracket.rankedElement(str(i), i) for i in range(1, num+1)])
+    LAYOUTS[layout](b)
+
+    return b
+
+def _timed(func):
+    start = timeit.default_timer()
+    result = func()
+    return (timeit.default_timer() - start, result)
+
+def _total_residual(b):
+    return sum(abs(e.residual()) for e in b)
+
+def run(num, layout, directory, sort=True, vectorized=False):
+    """ Time the operations on a single bracket, and return the results as a dictionary.
+
+    @num: the number of participants
+    @layout: the name of the layout used to arrange the participants
+    @directory: where the synthetic XML exports are written
+    @sort: whether or not to time bracket.sort()
+    @vectorized: whether or not to sort with NumPy
+
+    """
+    result = {"participants": num, "layout": layout}
+
+    b = generate_bracket(num, layout)
+    matchfile = os.path.join(directory, "matches.xml")
+    participantfile = os.path.join(directory, "participants.xml")
+    getbracket.write_xml(b, matchfile, participantfile)
+
+    result["generate"], b = _timed(lambda: getbracket.generate(matchfile, participantfile))
+    result["iter"], ignored = _timed(lambda: list(b))
+    result["iter_phase"], ignored = _timed(lambda: (list(b.iter_phase(0)), list(b.iter_phase(1))))
+    result["iter_ranked"], ignored = _timed(lambda: list(b.iter_ranked()))
+    result["residual"], total = _timed(lambda: _total_residual(b))
+    result["residual_before"] = total
+
+    if sort:
+        result["sort"], ignored = _timed(lambda: b.sort(vectorized))
+        result["residual_after"] = _total_residual(b)
+
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bracket loading, sorting and iteration.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="numbers of participants to benchmark")
+    parser.add_argument("--layouts", nargs="+", default=sorted(LAYOUTS), choices=sorted(LAYOUTS),
+                        help="arrangements of participants to benchmark")
+    parser.add_argument("--max-sort", type=int, default=None,
+                        help="skip sorting brackets with more participants than this")
+    parser.add_argument("--vectorized", action="store_true", help="sort with NumPy")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the layouts")
+    parser.add_argument("--output", default="benchmark.json", help="where to write the results")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    directory = tempfile.mkdtemp()
+    results = []
+
+    try:
+        for num in args.sizes:
+            for layout in args.layouts:
+                sort = args.max_sort is None or num <= args.max_sort
+                result = run(num, layout, directory, sort, args.vectorized)
+                results.append(result)
+
+                print "%6d %-12s generate %8.3fs  sort %8s" % (num, layout, result["generate"],
+                    "%.3fs" % result["sort"] if sort else "skipped")
+                sys.stdout.flush()
+    finally:
+        shutil.rmtree(directory)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": args.seed,
+        "vectorized": args.vectorized,
+        "results": results,
+    }
+
+    output = open(args.output, "w")
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.close()
+
+if __name__ == "__main__":
+    main()
@@ -23,38 +23,252 @@
 # SOFTWARE.
 
 import collections
-import math
 import copy
 import sys
 import itertools
+import heapq
+import array
+import timeit
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
     
 DEBUG = True
 
+def _swap_rating(ra, rb, a, b):
+    """Return how much swapping two elements lowers the residuals of their parents.
+
+    @ra, @rb: the residuals of the parents of the two elements
+    @a, @b: the ranks of the two elements
+
+    """
+    return abs(ra) + abs(rb) - abs(ra - a + b) - abs(rb - b + a)
+
+class _labelling(object):
+    """Shared by every element labelled in the same walk of a tree. When the tree changes 
+    shape, the labelling is marked as invalid for all of those elements at once."""
+    __slots__ = ("valid",)
+    
+    def __init__(self):
+        self.valid = True
+
+def _label(top, labelling, pre=0, post=0):
+    """Give every element under top (including top) pre-order and post-order labels, 
+    starting from the given numbers. An element x is nested under an element y exactly 
+    when y._pre < x._pre and x._post < y._post.
+    
+    """
+    stack = [(top, False)]
+    while stack:
+        e, visited = stack.pop()
+        if visited:
+            e._post = post
+            post += 1
+            continue
+        
+        e._pre = pre
+        e._labels = labelling
+        pre += 1
+        
+        stack.append((e, True))
+        if isinstance(e, branchedElement):
+            stack.append((e[1], False))
+            stack.append((e[0], False))
+
+class _budget(object):
+    """A limit on the time and number of swaps a sort may use, shared by all of its passes."""
+    __slots__ = ("deadline", "swaps", "stopped")
+    
+    def __init__(self, seconds=None, swaps=None):
+        self.deadline = None if seconds is None else timeit.default_timer() + seconds
+        self.swaps = swaps
+        self.stopped = False
+    
+    def spent(self):
+        """Return true once the time or swaps have run out."""
+        if not self.stopped:
+            self.stopped = ((self.swaps is not None and self.swaps <= 0) or 
+                            (self.deadline is not None and timeit.default_timer() >= self.deadline))
+        return self.stopped
+    
+    def swapped(self):
+        if self.swaps is not None:
+            self.swaps -= 1
+
+def _popcount(x):
+    return bin(x).count("1")
+
+class _separation(object):
+    """An index of the tags which separation rules apply to, for checking swaps against
+    those rules without walking the subtrees involved. Every (tag, value) pair is given
+    a bit, and each element holds the union of the bits of the ranked elements under it.
+    Two members of an element conflict when they share a bit which the element's phase is 
+    too early for.
+    
+    Only elements from phases before the latest limit are kept up to date, since the bits 
+    of later elements are never compared.
+    
+    """
+    
+    def __init__(self, top, rules):
+        """Index the ranked elements under top.
+        
+        @top: the topmost element in the bracket
+        @rules: a dictionary, or list of pairs, mapping each tag to the first phase in which
+        elements with the same value for that tag may meet
+        
+        """
+        limits = dict(rules)
+        self.limit = max(limits.values()) if limits else 0
+        self.bits = {}
+        self.mask = [0]*self.limit
+        
+        index = {}
+        stack = [(top, False)]
+        while stack:
+            e, visited = stack.pop()
+            
+            if isinstance(e, branchedElement):
+                if visited:
+                    self.bits[e] = self.bits[e._members[0]] | self.bits[e._members[1]]
+                else:
+                    stack.append((e, True))
+                    stack.extend((m, False) for m in e._members)
+                continue
+            
+            bits = 0
+            for tag in limits:
+                if tag in e.tags:
+                    key = (tag, e.tags[tag])
+                    if key not in index:
+                        index[key] = 1 << len(index)
+                        for p in range(limits[tag]):
+                            self.mask[p] |= index[key]
+                    bits |= index[key]
+            
+            self.bits[e] = bits
+    
+    def _mask(self, e):
+        phase = e._phase._phase
+        return self.mask[phase] if phase < self.limit else 0
+    
+    def conflicts(self, e):
+        """Return the number of conflicts between e and the elements it meets before the
+        phases its tags allow."""
+        total = 0
+        child = e
+        p = e._parent
+        while p is not None and p._phase._phase < self.limit:
+            sibling = p._members[1] if p._members[0] is child else p._members[0]
+            total += _popcount(self.bits[e] & self.bits[sibling] & self._mask(p))
+            child = p
+            p = p._parent
+        
+        return total
+    
+    def delta(self, a, b):
+        """Return the change in the number of conflicts in the bracket if a and b were 
+        swapped. Only the elements between a, b and the element they are both nested under
+        are affected, and only those from phases before the latest limit are compared.
+        
+        """
+        change = 0
+        ends = []
+        for (x, y) in ((a, b), (b, a)):
+            old = self.bits[x]
+            new = self.bits[y]
+            child = x
+            p = x._parent
+            while p is not None and p._phase._phase < self.limit and not p.contains_element(y):
+                sibling = p._members[1] if p._members[0] is child else p._members[0]
+                bits = self.bits[sibling]
+                mask = self._mask(p)
+                
+                change += _popcount(new & bits & mask) - _popcount(old & bits & mask)
+                old |= bits
+                new |= bits
+                child = p
+                p = p._parent
+            
+            ends.append((p, old, new))
+        
+        (p, old_a, new_a), (q, old_b, new_b) = ends
+        if p is not None and p is q:
+            mask = self._mask(p)
+            change += _popcount(new_a & new_b & mask) - _popcount(old_a & old_b & mask)
+        
+        return change
+    
+    def swapped(self, a, b):
+        """Update the index after a and b are swapped."""
+        self.bits[a], self.bits[b] = self.bits[b], self.bits[a]
+        
+        for x in (a, b):
+            p = x._parent
+            while p is not None and p._phase._phase < self.limit:
+                self.bits[p] = self.bits[p._members[0]] | self.bits[p._members[1]]
+                p = p._parent
+
 class bracketPhase(object):
-    """Structural information for a phase of a bracket."""
-    def __init__(self, participants, phase=0):
-        """Create a specified phase for a bracket with a certain number
-        of participants.
+    """Structural information for a phase of a bracket. Phases are immutable values, and
+    there is only one phase object for each number of participants and phase number, so
+    phases are shared between elements rather than copied.
+    
+    """
+    __slots__ = ("_participants", "_phase", "_size", "_min_rank", "_max_rank")
+    _interned = {}
+    
+    def __new__(cls, participants, phase=0):
+        """Return a specified phase for a bracket with a certain number
+        of participants. A negative phase is counted down from the top phase.
         
         """    
         if phase < 0:
-            phases = 1
-            i = 2
-            while i < participants:
-                i *= 2
-                phases += 1
-            
-            self._phase = phases+phase
+            phases = max(1, (participants - 1).bit_length())
+            phase = phases+phase
+        
+        return cls._get(participants, phase)
+    
+    @classmethod
+    def _get(cls, participants, phase):
+        if phase == int(phase):
+            phase = int(phase)
+        
+        p = cls._interned.get((participants, phase))
+        if p is not None:
+            return p
+        
+        size = 1 << max(0, participants - 1).bit_length()
+        
+        if phase <= 0:
+            size = size * 2**(-phase)
+        elif size % 2**phase == 0:
+            size = size // 2**phase
         else:
-            self._phase = phase
+            size = size / 2.0**phase
         
-        self._participants = participants
+        p = object.__new__(cls)
+        object.__setattr__(p, "_participants", participants)
+        object.__setattr__(p, "_phase", phase)
+        object.__setattr__(p, "_size", size)
+        object.__setattr__(p, "_min_rank", p._find_min_rank())
+        object.__setattr__(p, "_max_rank", p._find_max_rank())
         
-        size = 1
-        while size < self._participants:
-            size *= 2
-            
-        self._size = size / (2**(self._phase))
+        return cls._interned.setdefault((participants, phase), p)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("bracketPhase objects are immutable")
+    
+    def __copy__(self):
+        return self
+    
+    def __deepcopy__(self, memo):
+        return self
+    
+    def __reduce__(self):
+        return (_interned_phase, (self._participants, self._phase))
         
     def particpants(self):
         return self._participants
@@ -63,7 +277,17 @@ class bracketPhase(object):
         """Return the minimum rank of an element in this phase, assuming
         standard, incremental ranking and a seeded bracket.
         
-        """        
+        """
+        return self._min_rank
+        
+    def max_rank(self):
+        """Return the maximum rank of an element in this phase, assuming
+        standard, incremental ranking and a seeded bracket.
+        
+        """
+        return self._max_rank
+        
+    def _find_min_rank(self):
         if self._phase == 0:
             return self._size - self._participants + 1
         
@@ -75,11 +299,7 @@ class bracketPhase(object):
             
         return 0
         
-    def max_rank(self):
-        """Return the maximum rank of an element in this phase, assuming
-        standard, incremental ranking and a seeded bracket.
-        
-        """
+    def _find_max_rank(self):
         if self._phase == 1:
             return max(0, self._size*2 - self._participants)
 
@@ -92,24 +312,33 @@ class bracketPhase(object):
         return self._size
         
     def shifted(self, offset):
-        """Return a copy of this phase shifted by the given offset."""
-        p = copy.deepcopy(self)
-       
-        p._size = p._size / (2**offset)
-        p._phase += offset
-        
-        return p
+        """Return this phase shifted by the given offset."""
+        return bracketPhase._get(self._participants, self._phase + offset)
         
     def shifted_to_top(self):
         """Return a phase with size 1 that is otherwise the same as this phase."""
-        return self.shifted(math.floor(math.log(self._size, 2)))
+        offset = 0
+        size = self._size
+        while size > 1:
+            size /= 2.0
+            offset += 1
+        while size < 1:
+            size *= 2
+            offset -= 1
+        
+        return self.shifted(offset)
         
     def number(self):
         """ Return the phase number of this phase. """
         return self._phase
 
-class branchedElement(collections.Container):
+def _interned_phase(participants, phase):
+    return bracketPhase._get(participants, phase)
+
+class branchedElement(object):
     """A member of a bracket which contains two child members"""
+    __slots__ = ("_rank", "_parent", "_dirty", "_members", "_phase", "_sum", "_count", 
+                 "_count_ranked", "_pre", "_post", "_labels")
     
     def __init__(self, first=None, second=None, phase=None):
         """Create a single element of a bracket.
@@ -118,7 +347,13 @@ class branchedElement(collections.Container):
         
         """
         self._rank = 0
+        self._parent = None
+        self._dirty = True
+        self._labels = None
         self._members = [first, second]
+        for m in self._members:
+            self._adopt(m)
+
         if phase != None:
             self.phase = phase
         else:
@@ -126,12 +361,27 @@ class branchedElement(collections.Container):
         
     def __iter__(self):
         """ Return a generator for all the items contained in this element (including itself)"""
-        yield self
+        stack = [self]
+        while stack:
+            e = stack.pop()
+            yield e
+            
+            if isinstance(e, branchedElement):
+                stack.append(e[1])
+                stack.append(e[0])
+    
+    def _seeding_order(self):
+        """ Return this element's members in challonge seeding order, based on the shape
+        of the tree."""
+        heavy_side = 0
+        if self[0].count() < self[1].count():
+            heavy_side = 1
         
-        for i in self[0]:
-            yield i
-        for j in self[1]:
-            yield j
+        first_side = heavy_side
+        if self.count() % 8 == 5:
+            first_side = not heavy_side
+        
+        return (self[first_side], self[not first_side])
         
     def iter_phase(self, phasenum, req_count=1):
         """ Returns a generator for the elements from a specific phase. Elements are
@@ -142,41 +392,43 @@ class branchedElement(collections.Container):
         no count restrictions.
         
         """
-        if self.phase.number() == phasenum:
-            if self._count == req_count or req_count == 0:
-                yield self
-        
-        heavy_side = 0
-        if self[0]._count < self[1]._count:
-            heavy_side = 1
-        
-        first_side = heavy_side
-        if self._count % 8 == 5:
-            first_side = not heavy_side
+        stack = [self]
+        while stack:
+            e = stack.pop()
             
-        for i in self[first_side].iter_phase(phasenum, req_count):
-            yield i
-        for j in self[not first_side].iter_phase(phasenum, req_count):
-            yield j
+            if e.phase.number() == phasenum:
+                if e.count() == req_count or req_count == 0:
+                    yield e
+            
+            if isinstance(e, branchedElement):
+                first, second = e._seeding_order()
+                stack.append(second)
+                stack.append(first)
             
     def __getitem__(self, index):
         return self._members[index]
 
     def __setitem__(self, index, value):
+        self._disown(self._members[index])
         self._members[index] = value
-        phase = self._phase
+        self._adopt(value)
+        self._invalidate()
+        self._invalidate_labels()
         
     def __delitem__(self, index):
+        self._disown(self._members[index])
         del self._members[index]
+        self._invalidate()
+        self._invalidate_labels()
         
     def __len__(self):
         return len(self._members)
         
     def __contains__(self, element):
-        # TODO: Fix this so that all elements that get caught
-        # by the iterator are also caught here. Refactor the code 
-        # so that contains_elements is no longer used and this is
-        # used instead.
+        """Return true if the element would be found by iterating over this element."""
+        if isinstance(element, branchedElement) or isinstance(element, rankedElement):
+            return element is self or self.contains_element(element)
+        
         return element in self._members
     
     @property
@@ -192,20 +444,67 @@ class branchedElement(collections.Container):
         self[1].phase = plowered
     
     def contains_element(self, element):
-        if element in self:
-            return true
+        """Return true if the element is nested anywhere under this element. This is a 
+        comparison of labels if both elements were labelled by the same bracket and the
+        tree hasn't changed shape since, and a walk up from the element otherwise.
         
-        element_in_submembers = False
-        if isinstance(self[0], branchedElement):
-            if self[0].contains_element(element):
-                element_in_submembers = True
+        """
+        labels = self._labels
+        if labels is not None and labels.valid and labels is element._labels:
+            return self._pre < element._pre and element._post < self._post
         
-        if isinstance(self[1], branchedElement):
-            if self[1].contains_element(element):
-                element_in_submembers = True
+        for e in element.ancestors():
+            if e is self:
+                return True
         
-        return element_in_submembers
+        return False
     
+    def ancestors(self):
+        """Return a generator for the elements this element is nested under, starting 
+        with its parent and ending with the top of the tree."""
+        e = self._parent
+        while e is not None:
+            yield e
+            e = e._parent
+    
+    def _adopt(self, m):
+        if isinstance(m, branchedElement) or isinstance(m, rankedElement):
+            m._parent = self
+    
+    def _disown(self, m):
+        if isinstance(m, branchedElement) or isinstance(m, rankedElement):
+            if m._parent is self:
+                m._parent = None
+    
+    def _invalidate_labels(self):
+        if self._labels is not None:
+            self._labels.valid = False
+
+    def _invalidate(self):
+        """Mark the cached values of this element and all of its ancestors as out of date. 
+        This stops at the first element which is already out of date, since its ancestors 
+        must be out of date as well.
+        
+        """
+        e = self
+        while e is not None and not e._dirty:
+            e._dirty = True
+            e = e._parent
+
+    def _refresh(self):
+        """Recompute the cached rank, sum of ranks, count and ranked count of this element
+        from the cached values of its members.
+        
+        """
+        ranks = [self._rank_member(x) for x in self._members]
+        if len(ranks) > 0:
+            self._rank = min(ranks)
+        
+        self._sum = sum(ranks)
+        self._count = sum([self._count_member(x) for x in self._members]) + 1
+        self._count_ranked = sum([self._count_ranked_member(x) for x in self._members])
+        self._dirty = False
+
     def _rank_member(self, m):
         if isinstance(m, branchedElement) or isinstance(m, rankedElement):
             return m.rank()
@@ -217,13 +516,15 @@ class branchedElement(collections.Container):
         are no members, 0 is returned.
         
         """
-        if len(self._members) > 0:
-            self._rank = min([self._rank_member(x) for x in self._members])
+        if self._dirty:
+            self._refresh()
         return self._rank
         
     def sum_members(self):
         """Return the sum of ranks of all members."""
-        return sum([self._rank_member(x) for x in self._members])
+        if self._dirty:
+            self._refresh()
+        return self._sum
     
     def _count_member(self, m):
         if isinstance(m, branchedElement) or isinstance(m, rankedElement):
@@ -234,13 +535,17 @@ class branchedElement(collections.Container):
     def _count_ranked_member(self, m):
         if isinstance(m, branchedElement) or isinstance(m, rankedElement):
             return m.count_ranked()
+        
+        return 0
     
     def count_ranked(self):
         """Count the number of singleton elements contained within this element or 
         within this element's members.
         
         """
-        return sum([self._count_ranked_member(x) for x in self._members])
+        if self._dirty:
+            self._refresh()
+        return self._count_ranked
         
     def count(self):
         """Count the number of sub-elements contained in this element and return it.
@@ -260,7 +565,8 @@ class branchedElement(collections.Container):
         
         Alternatively, use element1.compare_structure(element2)
         """
-        self._count = sum([self._count_member(x) for x in self._members]) + 1
+        if self._dirty:
+            self._refresh()
         return self._count
         
     def compare_structure(self, other):
@@ -278,7 +584,7 @@ class branchedElement(collections.Container):
 
         """
        
-        return (self.sum_members()-1-self.phase.size()*2)
+        return (self.sum_members()-1-self._phase._size*2)
         
     def swap(self, other):
         """ Swap this element with another branched element in the bracket. This swap is purely
@@ -287,20 +593,31 @@ class branchedElement(collections.Container):
         """
         
         if self in other or other in self:
-            raise ValueError("Can't swap directly nested elements!")
-            #TODO: restrict deeply nested elements
+            raise ValueError("Can't swap nested elements!")
         
-        member1 = self[0]
-        member2 = self[1]
+        same_shape = self.count() == other.count()
         
-        self[0] = other[0]
-        self[1] = other[1]
+        self._members, other._members = other._members, self._members
+        for e in (self, other):
+            for m in e._members:
+                e._adopt(m)
+            e._invalidate()
         
-        other[0] = member1
-        other[1] = member2
+        # elements of the same shape keep their labels, so only the members need new ones
+        labels = self._labels
+        if same_shape and labels is not None and labels.valid and labels is other._labels:
+            for e in (self, other):
+                _label(e, labels, e._pre, e._post - e.count() + 1)
+        else:
+            self._invalidate_labels()
+            other._invalidate_labels()
+        
+collections.Container.register(branchedElement)
         
 class rankedElement(object):
     """A ranked singleton member of a bracket."""
+    __slots__ = ("_rank", "name", "phase", "tags", "_count", "_parent", "_pre", "_post", 
+                 "_labels")
     
     def __init__(self, name="", rank=0, phase=None, **kwargs):
         """Create a single, ranked element of a bracket"""
@@ -318,6 +635,8 @@ class rankedElement(object):
         
         self.tags = kwargs
         self._count = 1
+        self._parent = None
+        self._labels = None
     
     def __iter__(self):
         """ Returns this element. Helps the iteration process through a bracket."""
@@ -342,9 +661,26 @@ class rankedElement(object):
         """Return the rank of this element."""
         return self._rank
         
+    def ancestors(self):
+        """Return a generator for the elements this element is nested under, starting 
+        with its parent and ending with the top of the tree."""
+        e = self._parent
+        while e is not None:
+            yield e
+            e = e._parent
+    
+    def contains_element(self, element):
+        """Return false. Ranked elements have no members for other elements to be nested in."""
+        return False
+    
     def set_rank(self, value):
         """ Set this element's rank."""
         self._rank = value
+        self._invalidate()
+        
+    def _invalidate(self):
+        if self._parent is not None:
+            self._parent._invalidate()
         
     def count_ranked(self):
         """ Return 1. This is used recursively by branchedElement to count the number of 
@@ -369,8 +705,8 @@ class rankedElement(object):
         element is well-seeded in this phase.
 
         """
-        min_rank = self.phase.min_rank()
-        max_rank = self.phase.max_rank()
+        min_rank = self.phase._min_rank
+        max_rank = self.phase._max_rank
         
         if self._rank < min_rank:
             return self._rank - min_rank
@@ -396,6 +732,9 @@ class rankedElement(object):
         other._rank = temp_rank
         other.name = temp_name
         other.tags = temp_tags
+        
+        self._invalidate()
+        other._invalidate()
     
 class bracket(collections.Container):
     """A binary tree of elements that can be sorted by rank into a standard
@@ -408,18 +747,63 @@ class bracket(collections.Container):
         @top: the topmost element in the bracket
         
         """
+        self._set_top(top)
+    
+    def _set_top(self, top):
+        """Make top the topmost element of this bracket, and give every element under it the
+        phase and labels for the number of participants it holds."""
         self.top = top
         self._participants = top.count_ranked()
         self._phase = bracketPhase(self._participants).shifted_to_top()
         self.top.phase = self._phase
         
+        # the phases of this bracket, indexed by phase number
+        self._phases = [bracketPhase._get(self._participants, p) 
+                        for p in range(self._phase.number() + 1)]
+        
+        self._relabel()
+        
         # make sure everything is up to date
         top.rank()
         top.count()
     
     def __contains__(self, element):
         """Return true if the element is in this bracket tree."""
-        return self.top.contains_element(element)
+        if self.top._labels is None or not self.top._labels.valid:
+            self._relabel()
+        
+        return element in self.top
+    
+    def __reduce__(self):
+        """Pickle this bracket as a flat description of its shape, along with the ranks, 
+        names and tags of its ranked elements, rather than as a nest of element objects. 
+        Phases, counts and labels are rebuilt when it is unpickled.
+        
+        """
+        return (from_shape, self.flatten())
+    
+    def flatten(self):
+        """ Return a flat description of this bracket, as a tuple of its shape, and the 
+        ranks, names and tags of its ranked elements. The shape is a string with a byte for
+        every element in pre-order, which is 1 for branched elements and 0 for ranked ones.
+        The ranked elements are listed in the same order. from_shape() rebuilds the bracket.
+        
+        """
+        shape = array.array('B')
+        leaves = []
+        for e in self:
+            if isinstance(e, branchedElement):
+                shape.append(1)
+            else:
+                shape.append(0)
+                leaves.append(e)
+        
+        return (shape.tostring(), [e.rank() for e in leaves], [e.name for e in leaves], 
+                [e.tags for e in leaves])
+    
+    def _relabel(self):
+        """Label every element in this bracket, so nesting can be checked in O(1)."""
+        _label(self.top, _labelling())
     
     def __iter__(self):
         for i in self.top:
@@ -437,23 +821,59 @@ class bracket(collections.Container):
         for i in self.top.iter_phase(phasenum, req_count):
             yield i
     
-    def iter_ranked(self):
+    def iter_ranked(self, walk=None):
         """ Return an iterator for the ranked elements in this bracket, in bracket order, 
-        starting with the highest seeded member."""
-        return itertools.chain(self.iter_phase(1), self.iter_phase(0))
+        starting with the highest seeded member.
+        
+        @walk: the result of _walk(), if it has already been computed
+        
+        """
+        if walk is None:
+            walk = self._walk()
+        
+        return (e for (e, par) in itertools.chain(walk[(1, 1)], walk[(0, 1)]))
+    
+    def _walk(self):
+        """ Walk the whole tree once, in challonge seeding order, and return every element 
+        paired with its parent. The pairs are bucketed by the phase number and count of
+        the element, so that walk[(phasenum, count)] lists the same elements, in the same
+        order, as iter_phase(phasenum, count).
+        
+        """
+        walk = collections.defaultdict(list)
+        stack = [(self.top, None)]
+        while stack:
+            e, par = stack.pop()
+            walk[(e.phase.number(), e.count())].append((e, par))
+            
+            if isinstance(e, branchedElement):
+                first, second = e._seeding_order()
+                stack.append((second, e))
+                stack.append((first, e))
+        
+        return walk
+    
+    def phase(self, phasenum):
+        """ Return the bracketPhase object for a phase number of this bracket."""
+        return self._phases[phasenum]
+    
+    def total_residual(self):
+        """ Return the sum of the magnitudes of the residuals of every element in this 
+        bracket. This is zero when the bracket is perfectly seeded."""
+        return sum(abs(e.residual()) for e in self)
         
     def _rate_swap(self, a, apar, b, bpar):
         """Rate a swap between two elements from this bracket."""
         if a == b:
             return 0
     
-        if a._count != b._count:
+        if a.count() != b.count():
             return 0
         
-        ra = apar.residual()
-        rb = bpar.residual()
+        if a in b or b in a:
+            return 0
         
-        return abs(ra) + abs(rb) - abs(ra - a._rank + b._rank) - abs(rb - b._rank + a._rank)
+        return _swap_rating(apar.residual(), bpar.residual(), a.rank(), b.rank())
             
     def _find_swap_candidate(self, upper, e):
         """ Find a swap candidate under the upper element for the element e."""
@@ -495,64 +915,629 @@ class bracket(collections.Container):
         if tryout != None:
             e.swap(tryout)
            
-    def _get_rankeds(self):
-        participants = []
+    def _get_rankeds(self, walk=None):
+        if walk is None:
+            walk = self._walk()
         
-        for e in self:
-            if e._count in [3,5]:
-                if e[0]._count == 1:
-                    participants.append((e[0], e))
-                if e[1]._count == 1:
-                    participants.append((e[1], e))
+        participants = []
+        for ((phasenum, count), pairs) in sorted(walk.items()):
+            if count == 1:
+                participants += [(e, par) for (e, par) in pairs if par.count() in [3,5]]
         
         return participants
         
-    def _get_branches(self):
-        branches = []
+    def _get_branches(self, walk=None):
+        if walk is None:
+            walk = self._walk()
         
-        for e in self:
-            if e._count not in [1,3]:
-                if e[0]._count != 1:
-                    branches.append((e[0], e))
-                if e[1]._count != 1:
-                    branches.append((e[1], e))
+        branches = []
+        for ((phasenum, count), pairs) in sorted(walk.items()):
+            if count != 1:
+                branches += [(e, par) for (e, par) in pairs if par is not None]
         
         return branches
     
-    def _sort_elements(self, e_list):
-        for (e, par) in e_list:
-            max_rating = 0
-            tryout = None
+    def _separate(self, separation, e_list, stats=None, on_swap=None, budget=None):
+        """Swap ranked elements out of conflicts with the separation rules. Each ranked
+        element in a conflict is swapped with the element which removes the most conflicts,
+        and which raises the residuals of their parents the least. Return the number of 
+        swaps performed.
+        
+        @separation: the _separation index of this bracket
+        @e_list: a list of (rankedElement, parent) pairs
+        @stats, @on_swap, @budget: as for _sort_elements()
+        
+        """
+        swaps = 0
+        passes = 0
+        rated = 0
+        progress = True
+        while progress:
+            progress = False
+            passes += 1
+            
+            for (e, par) in e_list:
+                if budget is not None and budget.spent():
+                    progress = False
+                    break
+                
+                if not separation.conflicts(e):
+                    continue
+                
+                best = None
+                for (f, fpar) in e_list:
+                    if fpar is par:
+                        continue
+                    
+                    change = separation.delta(e, f)
+                    if change >= 0:
+                        continue
+                    
+                    rated += 1
+                    key = (change, -self._rate_swap(e, par, f, fpar))
+                    if best is None or key < best[0]:
+                        best = (key, f)
+                
+                if best is not None:
+                    f = best[1]
+                    e.swap(f)
+                    separation.swapped(e, f)
+                    if on_swap is not None:
+                        on_swap(e, f)
+                    if budget is not None:
+                        budget.swapped()
+                    
+                    swaps += 1
+                    progress = True
         
-            if par.residual() != 0:
-                for (e2, par2) in e_list:
-                    rating = self._rate_swap(e, par, e2, par2)
+        if stats is not None:
+            stats["passes"] += passes
+            stats["rated"] += rated
+            stats["swaps"] += swaps
+            stats["residual_calls"] += 2*rated
+            stats["rank_calls"] += 2*rated
+        
+        return swaps
+    
+    def _sort_elements(self, e_list, vectorized=False, separation=None, stats=None, 
+                       on_swap=None, budget=None):
+        """Swap elements from e_list, a list of (element, parent) pairs, until no swap
+        lowers the residual of any parent. Return the number of swaps performed.
+
+        Parents are kept in a heap keyed by residual, so the worst seeded parent is
+        handled first. A swap only updates the parents and ancestors it touched, and the
+        candidate list is never rebuilt. Candidates are tracked by element rather than by 
+        their place under a parent, since swapping two branches moves their members, and 
+        mirrored branches of the same count hold their members in opposite order.
+
+        @vectorized: if true, the ratings of all swap candidates for a parent are computed
+        at once as NumPy array operations, and the best one is picked with an argmax.
+        @separation: a _separation index. Swaps which would add conflicts with its rules 
+        are never made.
+        @stats: a dictionary of counters, as returned by sort(), to add the passes, ratings,
+        swaps and calls to residual() and rank() of this sort to
+        @on_swap: a function called with the two elements of every swap, once they are 
+        swapped
+        @budget: a _budget. The sort stops as soon as it is spent, leaving the elements 
+        in the layout reached so far.
+
+        """
+        if vectorized and numpy is None:
+            raise ImportError("NumPy is required for vectorized sorting.")
+
+        elements = [e for (e, par) in e_list]
+        parents = [par for (e, par) in e_list]
+        index = dict((e, i) for (i, e) in enumerate(elements))
+        counts = [e.count() for e in elements]
+        ranks = [e.rank() for e in elements]
+        slots = collections.defaultdict(list)
+        for i, par in enumerate(parents):
+            slots[par].append(i)
+
+        residuals = dict((par, par.residual()) for par in slots)
+        rank_calls = len(ranks)
+        residual_calls = len(residuals)
+        rated = [0]
+
+        # Entries under a parent with a nonzero residual, indexed by count and by the
+        # sign of the residual. A swap can only have a positive rating if the residuals
+        # of the two parents have opposite signs, and the rating is never more than
+        # twice the smaller of the two residuals.
+        unsettled = collections.defaultdict(set)
+        for i, par in enumerate(parents):
+            if residuals[par] != 0:
+                unsettled[(counts[i], residuals[par] > 0)].add(i)
+
+        def best_swap(par):
+            best = None
+            max_rating = 0
+            ra = residuals[par]
+
+            for i in slots[par]:
+                a = ranks[i]
+
+                for j in unsettled[(counts[i], ra < 0)]:
+                    rb = residuals[parents[j]]
+                    if 2*abs(rb) <= max_rating:
+                        continue
+
+                    rated[0] += 1
+                    rating = _swap_rating(ra, rb, a, ranks[j])
                     if rating > max_rating:
+                        if separation is not None and \
+                                separation.delta(elements[i], elements[j]) > 0:
+                            continue
+                        
                         max_rating = rating
-                        tryout = e2
-                
-                if max_rating > 0:
-                    e.swap(tryout)
-                    return True
+                        best = (i, j)
+
+                        if max_rating >= 2*abs(ra):
+                            return best
+
+            return best
+
+        if vectorized:
+            np_counts = numpy.array(counts)
+            np_ranks = numpy.array(ranks, dtype=float)
+            np_residuals = numpy.array([residuals[par] for par in parents], dtype=float)
+
+        def best_swap_vectorized(par):
+            best = None
+            max_rating = 0
+            ra = residuals[par]
+
+            for i in slots[par]:
+                a = ranks[i]
+
+                ratings = _swap_rating(ra, np_residuals, a, np_ranks)
+                rated[0] += len(ratings)
+                ratings[(np_counts != counts[i]) | (np_residuals*ra >= 0)] = 0
+
+                j = int(ratings.argmax())
+                while separation is not None and ratings[j] > max_rating:
+                    if separation.delta(elements[i], elements[j]) <= 0:
+                        break
                     
-        return False
+                    ratings[j] = 0
+                    j = int(ratings.argmax())
+                
+                if ratings[j] > max_rating:
+                    max_rating = ratings[j]
+                    best = (i, j)
+
+            return best
+
+        if vectorized:
+            best_swap = best_swap_vectorized
+
+        swaps = 0
+        passes = 0
+        progress = True
+        while progress:
+            progress = False
+            passes += 1
+            heap = [(-abs(r), slots[par][0], par) for (par, r) in residuals.items() if r != 0]
+            heapq.heapify(heap)
+
+            while heap:
+                if budget is not None and budget.spent():
+                    progress = False
+                    break
+                
+                key, order, par = heapq.heappop(heap)
+                if residuals[par] == 0 or -key != abs(residuals[par]):
+                    continue
+
+                best = best_swap(par)
+                if best is None:
+                    continue
+
+                a, b = elements[best[0]], elements[best[1]]
+                par1, par2 = parents[best[0]], parents[best[1]]
+
+                # the members of branches are swapped, so a and b trade residuals too
+                changed = set([a, b, par1, par2])
+                changed.update(par1.ancestors())
+                changed.update(par2.ancestors())
+
+                for p in changed:
+                    if residuals.get(p, 0) != 0:
+                        for i in slots[p]:
+                            unsettled[(counts[i], residuals[p] > 0)].discard(i)
+
+                a.swap(b)
+                if separation is not None:
+                    separation.swapped(a, b)
+                if on_swap is not None:
+                    on_swap(a, b)
+                if budget is not None:
+                    budget.swapped()
+
+                # swapped branches trade members, which now have new parents
+                for p in (a, b):
+                    if isinstance(p, branchedElement):
+                        members = [index[m] for m in p._members if m in index]
+                        for i in members:
+                            parents[i] = p
+                        if members or p in slots:
+                            slots[p] = members
+
+                for p in changed:
+                    if p not in residuals and not slots.get(p):
+                        continue
+
+                    residuals[p] = p.residual()
+                    residual_calls += 1
+                    rank_calls += len(slots[p])
+
+                    for i in slots[p]:
+                        ranks[i] = elements[i].rank()
+                        if vectorized:
+                            np_ranks[i] = ranks[i]
+                            np_residuals[i] = residuals[p]
+
+                    if residuals[p] != 0 and slots[p]:
+                        for i in slots[p]:
+                            unsettled[(counts[i], residuals[p] > 0)].add(i)
+                        heapq.heappush(heap, (-abs(residuals[p]), slots[p][0], p))
+
+                swaps += 1
+                progress = True
+
+        if stats is not None:
+            stats["passes"] += passes
+            stats["rated"] += rated[0]
+            stats["swaps"] += swaps
+            stats["residual_calls"] += residual_calls
+            stats["rank_calls"] += rank_calls
+
+        return swaps
+
+    def _slot_seeds(self):
+        """ Return every ranked element of this bracket paired with the seed its slot holds
+        in a standard seeded bracket of the same shape. Each element covers a block of the
+        order given by _seed_order(), and its members cover the two halves of that block. 
+        The member with as many participants as the first half holds goes first, so byes 
+        line up with the seeds that have no opponent.
+        
+        """
+        num = self._participants
+        order = _seed_order(1 << (num-1).bit_length())
+        
+        real = [0]
+        for seed in order:
+            real.append(real[-1] + (seed <= num))
+        
+        seeds = []
+        stack = [(self.top, 0, len(order))]
+        while stack:
+            e, start, width = stack.pop()
+            
+            if not isinstance(e, branchedElement):
+                seeds.append((e, min(order[start:start + width])))
+                continue
+            
+            if width < 2:
+                raise ValueError("The bracket is deeper than its number of phases allows.")
+            
+            width //= 2
+            first, second = e._members
+            if first.count_ranked() != real[start + width] - real[start]:
+                first, second = second, first
+            
+            stack.append((second, start + width, width))
+            stack.append((first, start, width))
+        
+        return seeds
+    
+    def _slot_of_seed(self, seed):
+        """ Return the ranked element in the slot which holds a seed, as in _slot_seeds()."""
+        for (e, h) in self._slot_seeds():
+            if h == seed:
+                return e
+        
+        raise ValueError("No slot holds seed " + str(seed))
+    
+    def _replace(self, e, replacement):
+        """ Put replacement in the place of e, which must have a parent."""
+        parent = e._parent
+        parent[0 if parent._members[0] is e else 1] = replacement
+    
+    def _reseed(self, vectorized, separate):
+        """ Re-seed this bracket once a participant has been added or removed, and return the
+        number of participants moved to another slot."""
+        # swaps copy tags, so participants are told apart by their ranks and names
+        held = [(e, e._rank, e.name) for e in self if isinstance(e, rankedElement)]
+        
+        self.sort(vectorized, "assignment", separate)
+        
+        return sum(1 for (e, rank, name) in held if (e._rank, e.name) != (rank, name))
+    
+    def add_participant(self, participant, vectorized=False, separate=None):
+        """ Add a participant to this bracket, such as a late registration, and re-seed the
+        bracket. The participant is paired with the seed that the next seed would play, so 
+        the byes stay where challonge puts them; only that slot changes shape. Ranks from
+        the participant's rank onwards are moved down by one to make room, and a participant
+        without a rank takes the last seed.
+        
+        The participants are then placed as sort(method="assignment") places them, which
+        takes O(n log n) time whatever the byes. A sorted bracket which gains a new last 
+        seed moves no one. The assignment re-seeds the whole bracket, so any layout found
+        with separation rules is discarded unless the same rules are given again here. 
+        Return the number of participants moved to another slot.
+        
+        @participant: a rankedElement which isn't in a bracket
+        @vectorized, @separate: as for sort()
+        
+        """
+        if participant._parent is not None or participant is self.top:
+            raise ValueError("The participant is already in a bracket.")
+        
+        num = self._participants
+        rank = participant.rank()
+        if rank < 1:
+            participant.set_rank(num + 1)
+        elif rank <= num:
+            for e in self:
+                if isinstance(e, rankedElement) and e.rank() >= rank:
+                    e.set_rank(e.rank() + 1)
+        
+        # seed num+1 plays the last of the seeds with a bye, or the last seed once there 
+        # are none left
+        opponent = self._slot_of_seed((1 << num.bit_length()) - num)
+        
+        parent = opponent._parent
+        side = parent is not None and parent._members[1] is opponent
+        pair = branchedElement(opponent, participant)
+        
+        if parent is None:
+            self.top = pair
+        else:
+            parent[int(side)] = pair
+        
+        self._set_top(self.top)
+        
+        return self._reseed(vectorized, separate)
+    
+    def remove_participant(self, participant, vectorized=False, separate=None):
+        """ Remove a participant from this bracket, such as a dropout, and re-seed the 
+        bracket. The opponent of the last seed takes a bye in its place, and the last seed
+        moves into the participant's slot, so the byes stay where challonge puts them. Ranks
+        after the participant's are moved up by one.
+        
+        The participants are then placed as in add_participant(), so separation rules must
+        be given again to keep them. Removing the last seed from a sorted bracket moves no 
+        one. Return the number of participants moved to another slot.
+        
+        @participant: a rankedElement from this bracket
+        @vectorized, @separate: as for sort()
+        
+        """
+        if not isinstance(participant, rankedElement) or participant not in self:
+            raise ValueError("The participant isn't in this bracket.")
+        
+        if self._participants <= 2:
+            raise ValueError("A bracket needs at least two participants.")
         
+        last = self._slot_of_seed(self._participants)
+        pair = last._parent
         
-    def sort(self):
+        if participant._parent is pair:
+            self._replace(pair, pair[1] if pair[0] is participant else pair[0])
+        else:
+            self._replace(pair, pair[1] if pair[0] is last else pair[0])
+            self._replace(participant, last)
+        
+        rank = participant.rank()
+        for e in self:
+            if isinstance(e, rankedElement) and e.rank() > rank:
+                e.set_rank(e.rank() - 1)
+        
+        self._set_top(self.top)
+        
+        return self._reseed(vectorized, separate)
+    
+    def _assignment(self):
+        """ Find the slot for every ranked element which minimises the total distance between
+        ranks and slot seeds. The cost of a placement is convex in rank along a line, so the 
+        minimum cost assignment is the one which matches ranks to seeds in sorted order. When
+        the ranks are exactly the seeds, each element goes straight to its slot instead.
+        
+        Return the ranked elements in slot order, the (rank, name, tags) entry each of them 
+        holds, and the entry each of them should hold. Entries are only ever moved, so they
+        can be matched by identity.
+        
+        """
+        slots = self._slot_seeds()
+        entries = [(e._rank, e.name, e.tags) for (e, h) in slots]
+        current = list(entries)
+        
+        seeds = [h for (e, h) in slots]
+        if set(seeds) == set(range(1, len(seeds)+1)) and \
+                set(rank for (rank, name, tags) in entries) == set(seeds):
+            by_seed = [None]*len(seeds)
+            for entry in entries:
+                by_seed[entry[0]-1] = entry
+            placed = [by_seed[h-1] for h in seeds]
+        else:
+            order = sorted(range(len(slots)), key=lambda i: seeds[i])
+            entries.sort(key=lambda entry: entry[0])
+            placed = [None]*len(slots)
+            for i, entry in zip(order, entries):
+                placed[i] = entry
+        
+        return [e for (e, h) in slots], current, placed
+    
+    def _place(self, elements, entries):
+        """Give each of the ranked elements the (rank, name, tags) entry at its index."""
+        for e, entry in zip(elements, entries):
+            e._rank, e.name, e.tags = entry
+            e._invalidate()
+    
+    def _sort_assignment(self):
+        """Place every ranked element in the slot that _assignment() finds for it."""
+        elements, current, placed = self._assignment()
+        self._place(elements, placed)
+    
+    def _settle(self, stats=None, on_swap=None, budget=None):
+        """ Finish a swap sort which has stalled with residual left. Every swap has to lower
+        the residuals around it, so some layouts are out of reach of the swap passes, such 
+        as those of subtrees with byes which are mirrored. If the placement found by 
+        _assignment() leaves less residual, it is made as a series of swaps of ranked 
+        elements, each of which puts one element in its final slot. Return the number of 
+        swaps performed.
+        
+        @stats, @on_swap, @budget: as for _sort_elements()
+        
+        """
+        before = self.total_residual()
+        if before == 0:
+            return 0
+        
+        elements, current, placed = self._assignment()
+        self._place(elements, placed)
+        after = self.total_residual()
+        self._place(elements, current)
+        
+        # every cycle of the placement takes one swap fewer than its length
+        source = dict((id(entry), i) for (i, entry) in enumerate(current))
+        needed = len(elements)
+        seen = set()
+        for i in range(len(elements)):
+            if i not in seen:
+                needed -= 1
+                while i not in seen:
+                    seen.add(i)
+                    i = source[id(placed[i])]
+        
+        if after >= before or (budget is not None and budget.swaps is not None and 
+                               budget.swaps < needed):
+            return 0
+        
+        # held[i] is the index in current of the entry element i holds, where[j] the reverse
+        held = range(len(elements))
+        where = range(len(elements))
+        swaps = 0
+        for i, entry in enumerate(placed):
+            j = where[source[id(entry)]]
+            if j == i:
+                continue
+            
+            if budget is not None and budget.spent():
+                break
+            
+            elements[i].swap(elements[j])
+            held[i], held[j] = held[j], held[i]
+            where[held[i]], where[held[j]] = i, j
+            
+            if on_swap is not None:
+                on_swap(elements[i], elements[j])
+            if budget is not None:
+                budget.swapped()
+            swaps += 1
+        
+        if stats is not None:
+            stats["swaps"] += swaps
+        
+        return swaps
+    
+    def sort(self, vectorized=False, method="swap", separate=None, stats=False, on_swap=None,
+             deadline=None, max_swaps=None):
         """ Sort this bracket. This sort attempts to get the bracket as close as possible 
         to a typical, seeded elimination format tournament bracket, where the rank of each 
         element is applied as its seed.
 
-        This is a very slow process due to the lack of restrictions on rank values. 
-        As such, if you wish to sort a standard bracket with basic seeding, use a 
-        different approach for maximum efficiency.
+        This can be a slow process due to the lack of restrictions on rank values. 
+        As such, if you wish to build a standard bracket with basic seeding, use
+        from_seeds() instead.
+        
+        @vectorized: rate swap candidates with NumPy array operations. This rates every 
+        element of the bracket against each candidate, where the plain rating skips and 
+        stops early, so it is slower on small brackets and only somewhat faster above a few
+        thousand entrants. Requires NumPy to be installed.
+        @method: "swap" to repeatedly swap the elements with the worst residuals, or 
+        "assignment" to place every ranked element at once, as an assignment of ranks to
+        the seeds of the slots in the tree. The assignment takes O(n log n) time, and keeps 
+        the shape of the tree, byes included. A swap sort which stalls with residual left
+        finishes with the assignment's placement, made as swaps, if that leaves less.
+        @separate: rules which keep ranked elements apart until a given phase, as a 
+        dictionary, or list of pairs, mapping a tag to the first phase in which elements
+        with the same value for that tag may meet. For example, {"region": 3} keeps players 
+        from the same region apart for the first two rounds. Elements are moved out of any
+        conflicts once the bracket is sorted, and the bracket is then sorted again without
+        adding new ones.
+        @stats: if true, count the passes made over the candidates, the candidate pairs 
+        rated, the swaps made, the calls made to residual() and rank(), and the seconds 
+        spent in each part of the sort, under keys starting with "time_".
+        @on_swap: a function called with the two elements of every swap, once they are 
+        swapped
+        @deadline: the most seconds the sort may take. Once they have passed, the sort stops
+        between swaps and leaves the bracket in the layout reached so far.
+        @max_swaps: the most swaps the sort may make, after which it stops in the same way
+        
+        The assignment method places every element at once, so a deadline or maximum number
+        of swaps only limits its separation swaps.
+        
+        Return the total residual left in the bracket, so that the caller can judge whether 
+        the layout is good enough. With stats, return a dictionary of the counters instead, 
+        which also holds the residual under "residual", and under "stopped", whether the 
+        sort ran out of time or swaps.
         
         """
-        while self._sort_elements(self._get_rankeds()):
-            pass
-
-        while self._sort_elements(self._get_branches()):
-            pass
+        if method not in ("swap", "assignment"):
+            raise ValueError("Unknown sort method: " + str(method))
+        
+        counters = collections.Counter()
+        clock = [timeit.default_timer()]
+        budget = None
+        if deadline is not None or max_swaps is not None:
+            budget = _budget(deadline, max_swaps)
+        
+        def lap(name):
+            now = timeit.default_timer()
+            counters["time_" + name] += now - clock[0]
+            clock[0] = now
+        
+        # swaps never change the shape of the tree, so one walk serves both passes
+        walk = self._walk()
+        lap("walk")
+        
+        if method == "assignment":
+            self._sort_assignment()
+            lap("assignment")
+        else:
+            self._sort_elements(self._get_rankeds(walk), vectorized, None, counters, on_swap, 
+                                budget)
+            lap("rankeds")
+            self._sort_elements(self._get_branches(walk), vectorized, None, counters, on_swap,
+                                budget)
+            lap("branches")
+            self._settle(counters, on_swap, budget)
+            lap("settle")
+        
+        if separate:
+            # swapping branches can change which members an element has, so walk again
+            walk = self._walk()
+            separation = _separation(self.top, separate)
+            lap("walk")
+            
+            self._separate(separation, self._get_rankeds(walk), counters, on_swap, budget)
+            lap("separate")
+            self._sort_elements(self._get_rankeds(walk), vectorized, separation, counters, 
+                                on_swap, budget)
+            lap("rankeds")
+            self._sort_elements(self._get_branches(walk), vectorized, separation, counters, 
+                                on_swap, budget)
+            lap("branches")
+        
+        if stats:
+            for key in ("passes", "rated", "swaps", "residual_calls", "rank_calls"):
+                counters[key] += 0
+            counters["residual"] = self.total_residual()
+            counters["stopped"] = budget is not None and budget.stopped
+            return dict(counters)
+        
+        return self.total_residual()
             
     def print_verbose(self):
         num_tabs=0
@@ -579,5 +1564,85 @@ class bracket(collections.Container):
                     sys.stdout.write('...')
                 
             sys.stdout.flush()
-                
-        stringify_branch(self.top, num_tabs)
\ No newline at end of file
+
+        stringify_branch(self.top, num_tabs)
+
+def from_shape(shape, ranks, names, tags):
+    """Rebuild a bracket from the flat description given by bracket.flatten(). Raise 
+    ValueError if the description doesn't make a single binary tree."""
+    shape = array.array('B', shape)
+    leaves = len(ranks)
+    if len(names) != leaves or len(tags) != leaves:
+        raise ValueError("Every ranked element needs a rank, a name and tags.")
+    
+    # a binary tree has one fewer branched element than ranked ones
+    if len(shape) != 2*leaves - 1 or shape.count(0) != leaves or shape.count(1) != leaves - 1:
+        raise ValueError("The shape doesn't describe a bracket of " + str(leaves) + 
+                         " ranked elements.")
+    
+    stack = []
+    
+    # members come after their parent in pre-order, so build from the end. With the counts
+    # above, a shape which never runs out of members leaves exactly one element
+    for node in reversed(shape):
+        if node:
+            if len(stack) < 2:
+                raise ValueError("The shape has a branched element without two members.")
+            stack.append(branchedElement(stack.pop(), stack.pop()))
+        else:
+            leaves -= 1
+            stack.append(rankedElement(names[leaves], ranks[leaves], **tags[leaves]))
+    
+    return bracket(stack.pop())
+
+def _seed_order(size):
+    """Return the seeds 1 through size in standard bracket order. Adjacent pairs in
+    the returned list are first round opponents, and each half of the list holds one
+    half of the bracket.
+
+    >>> _seed_order(8)
+    [1, 8, 4, 5, 2, 7, 3, 6]
+
+    """
+    order = [1]
+    while len(order) < size:
+        total = len(order)*2 + 1
+        order = [s for seed in order for s in (seed, total - seed)]
+
+    return order
+
+def from_seeds(participants):
+    """Build a bracket with the participants already placed in standard seeding order.
+    The participants are seeded by rank, so the lowest rank takes the first seed. Seeds
+    without a first round opponent receive a bye, as they would on challonge.
+
+    This skips bracket.sort() entirely. When the ranks are 1 through N, every element
+    of the returned bracket has a residual of zero.
+
+    @participants: a list of rankedElements to be placed in the bracket
+
+    """
+    ranked = sorted(participants, key=lambda e: e.rank())
+    num = len(ranked)
+
+    if num < 2:
+        raise ValueError("A bracket needs at least two participants.")
+
+    size = 1
+    while size < num:
+        size *= 2
+
+    order = _seed_order(size)
+    level = []
+    for i in range(0, size, 2):
+        high, low = order[i], order[i+1]
+
+        if low > num:
+            level.append(ranked[high-1])
+        else:
+            level.append(branchedElement(ranked[high-1], ranked[low-1]))
+
+    while len(level) > 1:
+        level = [branchedElement(level[i], level[i+1]) for i in range(0, len(level), 2)]
+
+    return bracket(level[0])
\ No newline at end of file
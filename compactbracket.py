@@ -0,0 +1,225 @@
+# compactbracket.py
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Jonathan Miller
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import array
+import itertools
+import bracket
+
+class compactBracket(object):
+    """A bracket stored as parallel arrays laid out as an implicit binary tree. The top
+    element is at index 0, and the members of the element at index i are at indices
+    2i+1 and 2i+2. Slots below a bye are left empty, with a count of 0.
+
+    This holds the same information as a bracket object in a handful of flat arrays,
+    rather than as a separate object for every element and phase.
+
+    """
+
+    def __init__(self, b):
+        """Create a compact copy of a bracket.
+
+        @b: the bracket object to be copied
+
+        """
+        self._participants = b._participants
+        self._phases = b._phases
+
+        slots = 2**len(self._phases) - 1
+        self.ranks = array.array('i', [0]) * slots
+        self.counts = array.array('i', [0]) * slots
+        self.phases = array.array('b', [0]) * slots
+        self.indices = array.array('i', [-1]) * slots
+        self.names = []
+        self.tags = []
+
+        stack = [(b.top, 0)]
+        while stack:
+            e, i = stack.pop()
+            if i >= slots:
+                raise ValueError("The bracket is deeper than its number of phases allows.")
+
+            self.ranks[i] = e.rank()
+            self.counts[i] = e.count()
+            self.phases[i] = int(e.phase.number())
+
+            if isinstance(e, bracket.branchedElement):
+                stack.append((e[1], 2*i + 2))
+                stack.append((e[0], 2*i + 1))
+            else:
+                self.indices[i] = len(self.names)
+                self.names.append(e.name)
+                self.tags.append(e.tags)
+
+        self.top = compactElement(self, 0)
+
+    def __iter__(self):
+        """ Return a generator for all the elements in this bracket, in the same order
+        as iterating over a bracket object."""
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            yield compactElement(self, i)
+
+            if self.indices[i] < 0:
+                stack.append(2*i + 2)
+                stack.append(2*i + 1)
+
+    def iter_phase(self, phasenum, req_count=1):
+        """ Returns a generator for the elements from a specific phase. Elements are
+        iterated through in challonge seeding order, based on the shape of the tree.
+
+        @phasenum: the index of the phase to be compared against the element's phase index.
+        @req_count: the count required for the element to be included. 0 means there are
+        no count restrictions.
+
+        """
+        counts = self.counts
+        stack = [0]
+        while stack:
+            i = stack.pop()
+
+            if self.phases[i] == phasenum:
+                if counts[i] == req_count or req_count == 0:
+                    yield compactElement(self, i)
+
+            if self.indices[i] >= 0:
+                continue
+
+            first = 2*i + 1
+            second = 2*i + 2
+            if counts[first] < counts[second]:
+                first, second = second, first
+
+            if counts[i] % 8 == 5:
+                first, second = second, first
+
+            stack.append(second)
+            stack.append(first)
+
+    def iter_ranked(self):
+        """ Return an iterator for the ranked elements in this bracket, in bracket order,
+        starting with the highest seeded member."""
+        return itertools.chain(self.iter_phase(1), self.iter_phase(0))
+
+    def phase(self, phasenum):
+        """ Return the bracketPhase object for a phase number of this bracket."""
+        return self._phases[phasenum]
+
+    def expand(self):
+        """ Return a bracket object built from this compact bracket."""
+        def build(i):
+            if self.indices[i] >= 0:
+                p = self.indices[i]
+                return bracket.rankedElement(self.names[p], self.ranks[i], **self.tags[p])
+
+            return bracket.branchedElement(build(2*i + 1), build(2*i + 2))
+
+        return bracket.bracket(build(0))
+
+class compactElement(object):
+    """A view of a single element of a compact bracket. This has the same interface as
+    the bracket elements it stands in for, so code which reads from a bracket can read
+    from a compact bracket as well.
+
+    """
+    __slots__ = ("_tree", "_index")
+
+    def __init__(self, tree, index):
+        self._tree = tree
+        self._index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, compactElement) and self._tree is other._tree
+                and self._index == other._index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self._tree), self._index))
+
+    def __str__(self):
+        if not self.is_ranked():
+            return object.__str__(self)
+
+        return str(self.name)
+
+    def __getitem__(self, index):
+        if self.is_ranked() or index not in (0, 1):
+            raise IndexError("Element has no member " + str(index))
+
+        return compactElement(self._tree, 2*self._index + 1 + index)
+
+    def __len__(self):
+        return 0 if self.is_ranked() else 2
+
+    def is_ranked(self):
+        """Return true if this element is a ranked singleton."""
+        return self._tree.indices[self._index] >= 0
+
+    @property
+    def name(self):
+        if not self.is_ranked():
+            raise AttributeError("A branched element has no name")
+
+        return self._tree.names[self._tree.indices[self._index]]
+
+    @property
+    def tags(self):
+        if not self.is_ranked():
+            raise AttributeError("A branched element has no tags")
+
+        return self._tree.tags[self._tree.indices[self._index]]
+
+    @property
+    def phase(self):
+        return self._tree.phase(self._tree.phases[self._index])
+
+    def rank(self):
+        return self._tree.ranks[self._index]
+
+    def count(self):
+        return self._tree.counts[self._index]
+
+    def count_ranked(self):
+        return (self.count() + 1) // 2
+
+    def sum_members(self):
+        return self[0].rank() + self[1].rank()
+
+    def residual(self):
+        """Return the residual of this element, as computed by the element it stands in for."""
+        phase = self.phase
+
+        if not self.is_ranked():
+            return self.sum_members() - 1 - phase.size()*2
+
+        rank = self.rank()
+        if rank < phase.min_rank():
+            return rank - phase.min_rank()
+
+        if rank > phase.max_rank():
+            return rank - phase.max_rank()
+
+        return 0
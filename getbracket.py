@@ -23,16 +23,28 @@
 # SOFTWARE.
 
 import sys
+import os
 import httplib
 import requests
 import bracket
 import xml.etree.ElementTree as ET
 import getpass
 import itertools
+import collections
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+from multiprocessing.pool import ThreadPool
 #TODO: Utilize existing REST API - pychallonge
 
 DEBUG = True
 
+API_URL = "https://api.challonge.com/v1"
+
+CHUNK_SIZE = 64*1024
+
 def authorize():
     # TODO: Implement a more convenient authentication method
     user = raw_input("Username: ")
@@ -40,83 +52,377 @@ def authorize():
 
     return (user, apikey)
 
-def post_bracket(b, tournament):
+def post_bracket(b, tournament, key=None, session=None, api=API_URL):
     """ POST a bracket object to challonge. There is no validation involved here.
     The bracket is sent as-is to challonge via bulk participant addition, which 
     may yield unexpected results due to challonge's limited bracket structures. 
     POST with caution.
     
+    All participants are sent in a single request, in seeding order, over one 
+    persistent session. Returns the responses from challonge; the time each request
+    took is available as response.elapsed.
+    
+    @b: the bracket object to be posted
+    @tournament: the challonge URL or id of the tournament
+    @key: a (username, API key) pair. If this is not given, the user is prompted for it.
+    @session: a requests.Session to send the requests with. A new one is opened if this
+    is not given.
+    @api: the address of the challonge API
+    
     """
-    key = authorize()
-    body = {}
-    address = "https://api.challonge.com/v1.tournaments/" + tournament + ".xml"
+    if key is None:
+        key = authorize()
+    
+    if session is None:
+        session = requests.Session()
+    session.auth = key
+    
+    responses = []
     
+    address = api + "/tournaments/" + tournament + ".xml"
     body = {"tournament[sequential_pairings]": "true"}
-    r = requests.post(address, data=body, auth=key)
+    responses.append(session.put(address, data=body))
     
-    address = "https://api.challonge.com/v1/tournaments/" + tournament +"/participants.xml"
-    body = {}
+    address = api + "/tournaments/" + tournament + "/participants/bulk_add.xml"
+    body = [("participants[][name]", e.name) for e in b.iter_ranked()]
+    responses.append(session.post(address, data=body))
     
-    for e in b.iter_ranked():
-        body["participant[name]"] = e.name
-        r = requests.post(address, data=body, auth=key)
+    for r in responses:
+        if DEBUG:
+            print r.request.method, r.url, r.status_code, "%.3fs" % r.elapsed.total_seconds()
+        r.raise_for_status()
     
-    print r.text
+    return responses
     
-def save_xml(tournament):
-    key = authorize()
-
-    r = requests.get("https://api.challonge.com/v1/tournaments/" + tournament + "/participants.xml", auth=key)
+def _download(session, address, fname):
+    """ Stream a file from an address to disk in chunks, without holding the whole 
+    response in memory."""
+    r = session.get(address, stream=True)
+    r.raise_for_status()
+    
+    output = open(fname, "wb")
+    try:
+        for chunk in r.iter_content(CHUNK_SIZE):
+            output.write(chunk)
+    finally:
+        output.close()
+        r.close()
+    
+    return fname
 
-    fname = tournament + "-participants.xml"
-    output = open(fname, "w")
-    output.write(r.text)
-    output.close()
+def save_all_xml(tournaments, key=None, directory=".", threads=8, api=API_URL):
+    """ Download the participant and match XML files for several tournaments at once.
+    All the downloads run concurrently, so this takes about as long as the slowest one. 
+    Returns a list of (matchfile, participantfile) pairs, in the same order as the 
+    tournaments, which can be passed straight to generate().
+    
+    @tournaments: a list of challonge URLs or ids of tournaments
+    @key: a (username, API key) pair. If this is not given, the user is prompted for it.
+    @directory: where the files are saved
+    @threads: the largest number of downloads to run at once
+    @api: the address of the challonge API
+    
+    """
+    if key is None:
+        key = authorize()
+    
+    files = []
+    jobs = []
+    for tournament in tournaments:
+        fnames = []
+        for kind in ("matches", "participants"):
+            fname = os.path.join(directory, tournament + "-" + kind + ".xml")
+            jobs.append((api + "/tournaments/" + tournament + "/" + kind + ".xml", fname))
+            fnames.append(fname)
+        files.append(tuple(fnames))
+    
+    threads = max(1, min(threads, len(jobs)))
+    session = requests.Session()
+    session.auth = key
+    session.mount(api, requests.adapters.HTTPAdapter(pool_maxsize=threads))
+    
+    pool = ThreadPool(threads)
+    try:
+        pool.map(lambda job: _download(session, *job), jobs)
+    finally:
+        pool.close()
+        session.close()
+    
+    return files
+    
+def save_xml(tournament, key=None, directory=".", api=API_URL):
+    """ Download the participant and match XML files for a tournament, and return the
+    location of the match file.
+    
+    """
+    matchfile, participantfile = save_all_xml([tournament], key, directory, api=api)[0]
+    
+    return matchfile
 
-    r = requests.get("https://api.challonge.com/v1/tournaments/" + tournament + "/matches.xml", auth=key)
+    
+matchRecord = collections.namedtuple("matchRecord", ["id", "round", "player1_id", "player2_id", 
+                                                     "player1_prereq", "player2_prereq",
+                                                     "player1_is_loser", "player2_is_loser"])
+participantRecord = collections.namedtuple("participantRecord", ["id", "name", "seed"])
 
-    fname = tournament + "-matches.xml"
-    output = open(fname, "w")
-    output.write(r.text)
-    output.close()
+def _records(source, tag, fields):
+    """ Return a generator for tuples of the text of some fields of each element with the 
+    given tag, read with iterparse. Each element is discarded as soon as it has been read, 
+    so the whole document is never held in memory. Missing fields, and fields marked as 
+    nil, are read as None.
     
-    return fname
+    @source: a filename or file object of an XML export
+    @tag: the tag of the elements to be read
+    @fields: the tags of the fields to be read from each element
+    
+    """
+    root = None
+    for event, e in ET.iterparse(source, events=("start", "end")):
+        if root is None:
+            root = e
+        
+        if event != "end" or e.tag != tag:
+            continue
+        
+        values = []
+        for field in fields:
+            child = e.find(field)
+            if child is None or child.get("nil") == "true":
+                values.append(None)
+            else:
+                values.append(child.text)
+        
+        yield tuple(values)
+        root.clear()
 
+class matchGraph(object):
+    """The graph of every match in an export, including the losers side and grand finals
+    of a double elimination bracket. Matches are indexed by id, along with the matches each
+    one feeds into, so the graph can be walked in either direction.
+    
+    Only the winners side is built into a bracket. The losers of each winners match drop
+    into fixed slots on the losers side, so the losers side is placed by the winners side,
+    and sorting a double elimination bracket costs no more than sorting its winners side.
+    
+    """
+    
+    def __init__(self, records):
+        """Build the graph in a single pass over the matches, plus a pass over the edges.
+        
+        @records: an iterable of matchRecords, in export order
+        
+        """
+        self.matches = collections.OrderedDict((m.id, m) for m in records)
+        self.feeds = collections.defaultdict(list)
+        
+        for m in self.matches.itervalues():
+            for (slot, prereq, loser) in _prereqs(m):
+                self.feeds[prereq].append((m.id, slot, loser))
+        
+        self.losers = [id for (id, m) in self.matches.iteritems() if m.round < 0]
+        
+        # grand finals are fed from the losers side, and resets are fed from grand finals
+        finals = set()
+        stack = list(self.losers)
+        while stack:
+            for (next, slot, loser) in self.feeds[stack.pop()]:
+                if self.matches[next].round > 0 and next not in finals:
+                    finals.add(next)
+                    stack.append(next)
+        
+        self.finals = [id for id in self.matches if id in finals]
+        self.winners = [id for (id, m) in self.matches.iteritems() 
+                        if m.round > 0 and id not in finals]
+        self.top = self._find_top()
     
-def _find_match(root, matchid):
-    for m in root.iter("match"):
-        id = m.find("id").text
+    def _find_top(self):
+        """ Find the last match of the winners side. This is the winners match whose winner
+        moves on to no other winners match. Matches fed by the losers of other matches, such 
+        as third place matches, and empty placeholder matches are left out.
         
-        if id == matchid:
-            return m
+        """
+        winners = set(self.winners)
+        top = None
+        for id in self.winners:
+            m = self.matches[id]
             
-def _find_top_match(root):
-    phase = 0
-    m_temp = None
-    for m in root.iter("match"):
-        if int(m.find("round").text) <= phase:
-            continue
+            if any(next in winners and not loser for (next, slot, loser) in self.feeds[id]):
+                continue
+            
+            if m.player1_is_loser or m.player2_is_loser:
+                continue
+            
+            if not _prereqs(m) and m.player1_id is None and m.player2_id is None:
+                continue
+            
+            if top is None or m.round > top.round:
+                top = m
         
-        phase = int(m.find("round").text)
-        m_temp = m
+        return top
     
-    for m in root.iter("match"):
-        if phase-1 == int(m.find("round").text):
-            return m
+    def tree(self, participants):
+        """ Return the bracket for the winners side, and a dictionary mapping the id of each
+        winners match to the branched element built for it. Sorting the bracket moves the 
+        members of elements rather than the elements themselves, so the dictionary still 
+        maps each match to its place in the bracket after sorting.
+        
+        @participants: a dictionary mapping participant ids to their participantRecords
+        
+        """
+        elements = {}
+        be = generate_branch(self.top, self.matches, participants, elements)
+        
+        return bracket.bracket(be), elements
     
-    return None
+    def drops(self):
+        """ Return a list of (match id, slot, winners match id) for every slot on the losers
+        side or in the grand finals which is taken by the loser of a winners match."""
+        winners = set(self.winners)
+        return [(next, slot, id) for id in self.winners 
+                for (next, slot, loser) in self.feeds[id] if loser and next not in winners]
+    
+    def losers_entries(self, elements):
+        """ Return a dictionary mapping (match id, slot) to the branched element whose match
+        decides who takes that slot on the losers side, placed as it is in the winners 
+        bracket.
+        
+        @elements: the dictionary of elements returned by tree()
+        
+        """
+        return dict(((next, slot), elements[id]) for (next, slot, id) in self.drops() 
+                    if id in elements)
+
+def _prereqs(m):
+    """Return (slot, match id, true if the slot takes the loser) for each prereq of m."""
+    prereqs = []
+    if m.player1_prereq is not None:
+        prereqs.append((1, m.player1_prereq, bool(m.player1_is_loser)))
+    if m.player2_prereq is not None:
+        prereqs.append((2, m.player2_prereq, bool(m.player2_is_loser)))
+    
+    return prereqs
+
+def read_graph(matchfile):
+    """ Read every match from an XML export into a matchGraph.
     
+    @matchfile: a filename or file object of the matches export
+    
+    """
+    fields = ["id", "round", "player1-id", "player2-id", "player1-prereq-match-id", 
+              "player2-prereq-match-id", "player1-is-prereq-match-loser", 
+              "player2-is-prereq-match-loser"]
+    
+    return matchGraph(matchRecord(values[0], int(values[1]), values[2], values[3], values[4],
+                                  values[5], values[6] == "true", values[7] == "true") 
+                      for values in _records(matchfile, "match", fields))
+
+def read_matches(matchfile):
+    """ Read the matches from an XML export. Return a dictionary mapping match ids to 
+    matchRecords, and the record of the last match of the winners side.
+    
+    @matchfile: a filename or file object of the matches export
+    
+    """
+    graph = read_graph(matchfile)
+    return graph.matches, graph.top
+
+def read_participants(participantfile):
+    """ Read the participants from an XML export. Return a dictionary mapping participant 
+    ids to participantRecords.
+    
+    @participantfile: a filename or file object of the participants export
+    
+    """
+    participants = {}
+    for (id, name, seed) in _records(participantfile, "participant", ["id", "name", "seed"]):
+        participants[id] = participantRecord(id, name, int(seed))
+    
+    return participants
+
+def _load_json(source):
+    """ Decode a JSON export, given as a filename, a file object, or the JSON itself."""
+    if hasattr(source, "read"):
+        return json.load(source)
+    
+    if source.lstrip()[:1] in ("[", "{"):
+        return json.loads(source)
+    
+    f = open(source, "rb")
+    try:
+        return json.load(f)
+    finally:
+        f.close()
+
+def _json_id(value):
+    return None if value is None else str(value)
+
+def read_graph_json(source):
+    """ Read every match from a JSON export, as given by the matches.json endpoint, into a
+    matchGraph.
+    
+    @source: a filename or file object of the matches export, or the JSON itself
+    
+    """
+    records = []
+    for item in _load_json(source):
+        m = item.get("match", item)
+        records.append(matchRecord(_json_id(m["id"]), int(m["round"]), 
+                                   _json_id(m.get("player1_id")), _json_id(m.get("player2_id")),
+                                   _json_id(m.get("player1_prereq_match_id")), 
+                                   _json_id(m.get("player2_prereq_match_id")),
+                                   bool(m.get("player1_is_prereq_match_loser")),
+                                   bool(m.get("player2_is_prereq_match_loser"))))
+    
+    return matchGraph(records)
+
+def read_matches_json(source):
+    """ Read the matches from a JSON export. Return the same as read_matches().
+    
+    @source: a filename or file object of the matches export, or the JSON itself
+    
+    """
+    graph = read_graph_json(source)
+    return graph.matches, graph.top
+
+def read_participants_json(source):
+    """ Read the participants from a JSON export, as given by the participants.json 
+    endpoint. Return the same as read_participants().
+    
+    @source: a filename or file object of the participants export, or the JSON itself
+    
+    """
+    participants = {}
+    for item in _load_json(source):
+        p = item.get("participant", item)
+        id = _json_id(p["id"])
+        participants[id] = participantRecord(id, p["name"], int(p["seed"]))
+    
+    return participants
+
+def generate_json(matches, participants):
+    """ Generate a bracket from JSON exports of matches and participants. This builds the 
+    same bracket as generate() does from the XML exports.
+    
+    @matches: a filename or file object of the matches export, or the JSON itself
+    @participants: a filename or file object of the participants export, or the JSON itself
+    
+    """
+    matches, top = read_matches_json(matches)
+    be = generate_branch(top, matches, read_participants_json(participants))
+    
+    return bracket.bracket(be)
+
 def generate(matchfile, participantfile=""):
-    """ Generate a bracket from a file of matches.
+    """ Generate a bracket from a file of matches. Both exports are streamed, so only the 
+    fields needed to build the bracket are kept in memory. For a double elimination 
+    bracket, this is the winners side; read_graph() gives the whole bracket.
     
     @matchfile: The location of the XML file containing match information 
     @playerfile: The location of the XML file containing player information
     
     """
-    tourney = ET.parse(matchfile)
-    root = tourney.getroot()    
-    participants = ET.parse(participantfile).getroot()
-    be = generate_branch(_find_top_match(root), root, participants)
+    matches, top = read_matches(matchfile)
+    be = generate_branch(top, matches, read_participants(participantfile))
     
     return bracket.bracket(be)
    
@@ -124,29 +430,90 @@ def generate_participant(id, participants):
     """ Generate a participant in the tournament as a rankedElement
 
     @id: the number used to identify the participant in the XML file
-    @participants: the root for the element tree containing all participants
+    @participants: a dictionary mapping participant ids to their participantRecords
     
     """
+    p = participants.get(id)
+    if p is None:
+        raise ValueError("The player with ID " + str(id) + " was not found.")
     
-    for p in participants.iter("participant"):
-        for element in p.iter("id"):
-            if element.text == id:
-                return bracket.rankedElement(p.find("name").text, int(p.find("seed").text))
-    
-    raise ValueError("The player with ID " + id + " was not found.")
+    return bracket.rankedElement(p.name, p.seed)
 
-def generate_branch(match, root, participants):
-    matchref = match.find("player1-prereq-match-id")
+def generate_branch(match, matches, participants, elements=None):
+    """ Generate the branch of the tournament leading up to a match.
+    
+    @match: the matchRecord of the match
+    @matches: a dictionary mapping match ids to their matchRecords
+    @participants: a dictionary mapping participant ids to their participantRecords
+    @elements: if given, a dictionary which the id of each match in the branch is added to,
+    mapped to the element generated for it
     
-    if matchref.get("nil") != "true":
-        member1 = generate_branch(_find_match(root, matchref.text), root, participants)
+    """
+    if match.player1_prereq is not None:
+        member1 = generate_branch(matches[match.player1_prereq], matches, participants, elements)
     else:
-        member1 = generate_participant(match.find("player1-id").text, participants)
+        member1 = generate_participant(match.player1_id, participants)
     
-    matchref = match.find("player2-prereq-match-id")
-    if matchref.get("nil") != "true":
-        member2 = generate_branch(_find_match(root, matchref.text), root, participants)
+    if match.player2_prereq is not None:
+        member2 = generate_branch(matches[match.player2_prereq], matches, participants, elements)
     else:
-        member2 = generate_participant(match.find("player2-id").text, participants)
+        member2 = generate_participant(match.player2_id, participants)
+    
+    e = bracket.branchedElement(member1, member2)
+    if elements is not None:
+        elements[match.id] = e
+    
+    return e
+
+def write_xml(b, matchfile, participantfile):
+    """ Write a bracket to a pair of XML files in the same format as challonge's match
+    and participant exports, so that generate() can read it back. Rounds are numbered by
+    phase, and an empty grand final is added above the top match, as in challonge's
+    double elimination exports.
+    
+    @b: the bracket object to be written
+    @matchfile: The location of the XML file to write match information to
+    @participantfile: The location of the XML file to write player information to
+    
+    """
+    matches = ET.Element("matches", type="array")
+    participants = ET.Element("participants", type="array")
+    
+    def add(tag, parent, text=None, **attrib):
+        e = ET.SubElement(parent, tag, **attrib)
+        e.text = text
+        return e
+    
+    def add_match(members, number):
+        m = add("match", matches)
+        id = str(len(matches))
+        add("id", m, id, type="integer")
+        add("round", m, str(number), type="integer")
+        
+        for i, member in enumerate(members):
+            player = "player" + str(i+1)
+            
+            if isinstance(member, bracket.branchedElement):
+                add(player + "-id", m, None, type="integer", nil="true")
+                add(player + "-prereq-match-id", m, add_match([member[0], member[1]], number-1), 
+                    type="integer")
+            elif isinstance(member, bracket.rankedElement):
+                p = add("participant", participants)
+                pid = str(len(participants))
+                add("id", p, pid, type="integer")
+                add("name", p, member.name)
+                add("seed", p, str(member.rank()), type="integer")
+                add(player + "-id", m, pid, type="integer")
+                add(player + "-prereq-match-id", m, None, type="integer", nil="true")
+            else:
+                add(player + "-id", m, None, type="integer", nil="true")
+                add(player + "-prereq-match-id", m, None, type="integer", nil="true")
         
-    return bracket.branchedElement(member1, member2)
\ No newline at end of file
+        return id
+    
+    top_round = int(b.top.phase.number())
+    add_match([b.top[0], b.top[1]], top_round)
+    add_match([None, None], top_round + 1)
+    
+    ET.ElementTree(matches).write(matchfile, encoding="UTF-8")
+    ET.ElementTree(participants).write(participantfile, encoding="UTF-8")
@@ -0,0 +1,148 @@
+# layoutcache.py
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Jonathan Miller
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import array
+import collections
+import os
+import pickle
+import tempfile
+import bracket
+
+class layoutCache(object):
+    """A memo of the layouts that bracket.sort() produces. Layouts are keyed by the shape 
+    of the tree, the ranks of its ranked elements in tree order, and the sort options 
+    which change the outcome, and map to the swaps the sort made. Each swap is recorded 
+    as the positions of its two elements in the unsorted tree, so replaying the swaps on 
+    a tree of the same shape reproduces the layout exactly, including branches which were 
+    swapped with their mirror images. Names play no part in sorting, so events with the 
+    same shape and seeding share a layout, and applying a cached layout takes one step per
+    swap rather than a search for swaps.
+    
+    The assignment method already places every element in O(n log n) time, so brackets
+    sorted with it are sorted directly rather than cached.
+    
+    Ranks are compared as they are, since residuals depend on their values and not only on 
+    their order. The least recently used layouts are evicted once the cache is full.
+    
+    """
+    
+    def __init__(self, capacity=1024, filename=None):
+        """Create a layout cache, loading any layouts saved to filename before.
+        
+        @capacity: the most layouts to keep
+        @filename: where the cache is saved by save(). None keeps it in memory only.
+        
+        """
+        self.capacity = capacity
+        self.filename = filename
+        self._layouts = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        
+        if filename is not None and os.path.exists(filename):
+            f = open(filename, "rb")
+            try:
+                for key, layout in pickle.load(f):
+                    self._store(key, layout)
+            finally:
+                f.close()
+    
+    def __len__(self):
+        return len(self._layouts)
+    
+    def _store(self, key, layout):
+        self._layouts.pop(key, None)
+        self._layouts[key] = layout
+        
+        while len(self._layouts) > self.capacity:
+            self._layouts.popitem(last=False)
+    
+    def _key(self, shape, leaves, method, separate):
+        rules = ()
+        tags = ()
+        if separate:
+            rules = tuple(sorted(dict(separate).items()))
+            
+            # tag values only matter in so far as they are shared, so number them in order
+            numbers = {}
+            tags = tuple(numbers.setdefault((tag, e.tags.get(tag)), len(numbers)) 
+                         for e in leaves for (tag, phase) in rules)
+        
+        return (shape, tuple(e.rank() for e in leaves), method, rules, tags)
+    
+    def sort(self, b, vectorized=False, method="swap", separate=None):
+        """ Sort a bracket, applying a cached layout if there is one for it, and caching the
+        layout otherwise. Return true if a cached layout was applied.
+        
+        @b: the bracket to be sorted
+        @vectorized, @method, @separate: as for bracket.sort()
+        
+        """
+        if method == "assignment":
+            b.sort(vectorized, method, separate)
+            return False
+        
+        shape = b.flatten()[0]
+        elements = list(b)
+        leaves = [e for e in elements if isinstance(e, bracket.rankedElement)]
+        key = self._key(shape, leaves, method, separate)
+        
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._store(key, layout)
+            self.hits += 1
+            
+            for i in range(0, len(layout), 2):
+                elements[layout[i]].swap(elements[layout[i+1]])
+            
+            return True
+        
+        self.misses += 1
+        
+        index = dict((e, i) for (i, e) in enumerate(elements))
+        layout = array.array('i')
+        
+        def record(x, y):
+            layout.append(index[x])
+            layout.append(index[y])
+        
+        b.sort(vectorized, method, separate, on_swap=record)
+        
+        self._store(key, layout)
+        return False
+    
+    def save(self):
+        """ Save the cache to its file, replacing the file in a single step."""
+        if self.filename is None:
+            raise ValueError("This cache has no file to be saved to.")
+        
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, temp = tempfile.mkstemp(dir=directory)
+        f = os.fdopen(fd, "wb")
+        try:
+            pickle.dump(list(self._layouts.items()), f, 2)
+        finally:
+            f.close()
+        
+        os.rename(temp, self.filename)
@@ -0,0 +1,110 @@
+# pools.py
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Jonathan Miller
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Splitting large entrant lists into pools, and seeding a new bracket from pool results.
+
+    >>> groups = pools.build(participants, 8)
+    >>> b = pools.merge([finishers(g) for g in groups], advance=2)
+
+"""
+
+import bracket
+import batchsort
+
+def split(participants, pools):
+    """ Split participants into seed-balanced pools by snake seeding. Participants are taken 
+    in order of rank and dealt across the pools, with the direction reversed every round, so
+    that every pool receives one of the top seeds and the strongest pools receive the weakest
+    of the rest. Each pool is returned in order of rank.
+    
+    @participants: a list of rankedElements
+    @pools: the number of pools to split them into
+    
+    """
+    if pools < 1:
+        raise ValueError("There must be at least one pool.")
+    
+    if len(participants) < 2*pools:
+        raise ValueError("Every pool needs at least two participants.")
+    
+    groups = [[] for i in range(pools)]
+    ranked = sorted(participants, key=lambda e: e.rank())
+    
+    for i, e in enumerate(ranked):
+        column = i % pools
+        if (i // pools) % 2:
+            column = pools - 1 - column
+        
+        groups[column].append(e)
+    
+    return groups
+
+def _reranked(participants, start=1):
+    """Return copies of participants with ranks counted from start, in the given order."""
+    return [bracket.rankedElement(e.name, start + i, **dict(e.tags)) 
+            for (i, e) in enumerate(participants)]
+
+def build(participants, pools, processes=None, vectorized=False, separate=None):
+    """ Split participants into pools, and build a seeded bracket for each pool with 
+    bracket.from_seeds(). Participants are ranked 1 through N within their pool, since a 
+    bracket is only seeded relative to ranks counted from 1; the elements passed in are 
+    left as they are.
+    
+    Seeded brackets are already sorted, so they are built in this process. Only when 
+    separation rules are given do the pools need sorting, which is then done in parallel
+    with batchsort.sort_all().
+    
+    @participants: a list of rankedElements
+    @pools: the number of pools to split them into
+    @processes: the number of worker processes. Defaults to the number of CPUs.
+    @vectorized: sort with NumPy, as in bracket.sort()
+    @separate: rules which keep ranked elements apart, as in bracket.sort()
+    
+    """
+    groups = [bracket.from_seeds(_reranked(group)) for group in split(participants, pools)]
+    if not separate:
+        return groups
+    
+    return batchsort.sort_all(groups, processes, vectorized, separate)
+
+def merge(results, advance=None):
+    """ Seed a new bracket from the results of pools. Participants finishing in the same 
+    place are seeded together, in the order of their pools, and better places are seeded 
+    ahead of worse ones. 
+    
+    @results: a list holding a list of rankedElements for each pool, in finishing order
+    @advance: how many participants advance from each pool. Defaults to all of them.
+    
+    """
+    advancing = []
+    place = 0
+    while advance is None or place < advance:
+        row = [finishers[place] for finishers in results if place < len(finishers)]
+        if not row:
+            break
+        
+        advancing.extend(row)
+        place += 1
+    
+    return bracket.from_seeds(_reranked(advancing))
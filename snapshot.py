@@ -0,0 +1,163 @@
+# snapshot.py
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2015 Jonathan Miller
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""A compact binary format for saving and reloading brackets, without parsing the XML
+exports again. A snapshot is laid out as
+
+    header       magic, version, and the sizes of the sections below
+    shape        a byte for every element in pre-order: 1 if branched, 0 if ranked
+    ranks        a 32 bit integer for every ranked element, in the same order
+    offsets      where each name starts in the string table, plus where the last one ends
+    strings      the names of the ranked elements, encoded as UTF-8
+    tags         the tags of the ranked elements, as a JSON list
+
+Integers are little-endian. The tags section is empty when no element has any tags.
+
+"""
+
+import array
+import json
+import mmap
+import struct
+import sys
+import bracket
+
+MAGIC = "CSRT"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sHxxIIII")
+
+def _little_endian(a):
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+def dumps(b):
+    """ Return a snapshot of a bracket as a string of bytes.
+    
+    @b: the bracket to be saved. Tags must be serializable as JSON.
+    
+    """
+    shape, ranks, names, tags = b.flatten()
+    
+    strings = []
+    offsets = array.array('I', [0])
+    for name in names:
+        if isinstance(name, unicode):
+            name = name.encode("utf-8")
+        else:
+            name = str(name)
+        
+        strings.append(name)
+        offsets.append(offsets[-1] + len(name))
+    
+    strings = "".join(strings)
+    tags = json.dumps(tags) if any(tags) else ""
+    
+    return "".join([_HEADER.pack(MAGIC, VERSION, len(shape), len(ranks), len(strings), len(tags)),
+                    shape,
+                    _little_endian(array.array('i', ranks)).tostring(),
+                    _little_endian(offsets).tostring(),
+                    strings,
+                    tags])
+
+def loads(data):
+    """ Return the bracket held in a snapshot.
+    
+    @data: the bytes of the snapshot, as a string, buffer or mmap
+    
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("The snapshot is truncated.")
+    
+    magic, version, nodes, leaves, string_size, tag_size = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("This is not a bracket snapshot.")
+    
+    if version != VERSION:
+        raise ValueError("Unsupported snapshot version " + str(version))
+    
+    start = _HEADER.size
+    sizes = [nodes, 4*leaves, 4*(leaves + 1), string_size, tag_size]
+    if len(data) < start + sum(sizes):
+        raise ValueError("The snapshot is truncated.")
+    
+    sections = []
+    for size in sizes:
+        sections.append(data[start:start + size])
+        start += size
+    
+    shape, ranks, offsets, strings, tags = sections
+    
+    ranks = _little_endian(array.array('i', ranks))
+    offsets = _little_endian(array.array('I', offsets))
+    
+    names = []
+    for i in range(leaves):
+        name = strings[offsets[i]:offsets[i+1]]
+        try:
+            name.decode("ascii")
+        except UnicodeDecodeError:
+            name = name.decode("utf-8")
+        names.append(name)
+    
+    if tags:
+        tags = [dict((str(k), v) for (k, v) in t.items()) for t in json.loads(tags)]
+    else:
+        tags = [{} for i in range(leaves)]
+    
+    return bracket.from_shape(shape, ranks.tolist(), names, tags)
+
+def save(b, filename):
+    """ Save a snapshot of a bracket to a file.
+    
+    @b: the bracket to be saved
+    @filename: where the snapshot is written
+    
+    """
+    f = open(filename, "wb")
+    try:
+        f.write(dumps(b))
+    finally:
+        f.close()
+
+def load(filename, use_mmap=False):
+    """ Load a bracket from a snapshot file, with a single read.
+    
+    @filename: the snapshot file
+    @use_mmap: map the file into memory rather than reading it
+    
+    """
+    f = open(filename, "rb")
+    try:
+        if not use_mmap:
+            return loads(f.read())
+        
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return loads(data)
+        finally:
+            data.close()
+    finally:
+        f.close()
@@ -26,7 +26,62 @@ import bracket
 from bracket import bracketPhase, branchedElement, rankedElement
 import unittest
 import getbracket
+import compactbracket
+import batchsort
+import pools
+import snapshot
+import layoutcache
 import random
+import copy
+import pickle
+import os
+import shutil
+import tempfile
+import json
+import io
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+import xml.etree.ElementTree as ET
+
+def write_export(b, directory):
+    """ Write a bracket as a pair of challonge XML exports in a directory, and return the 
+    locations of the match and participant files."""
+    matchfile = os.path.join(directory, "matches.xml")
+    participantfile = os.path.join(directory, "participants.xml")
+    getbracket.write_xml(b, matchfile, participantfile)
+    
+    return (matchfile, participantfile)
+
+def shuffle_leaves(b, rng=random):
+    """ Swap every ranked element of a bracket with a randomly chosen one, and return the
+    bracket."""
+    leaves = [e for e in b if isinstance(e, rankedElement)]
+    for e in leaves:
+        e.swap(rng.choice(leaves))
+    
+    return b
+
+def shuffled_bracket(num, rng=random, prefix="", mirrored=False, **tags):
+    """ Seed a bracket of num participants, named for their ranks after prefix, and shuffle
+    it with shuffle_leaves(). Each keyword maps a tag to a function giving its value for a 
+    rank. With mirrored, the members of about half the branched elements are reversed first,
+    so that subtrees of the same count face either way.
+    
+    """
+    participants = [rankedElement(prefix + str(i), i, 
+                                  **dict((tag, f(i)) for (tag, f) in tags.items()))
+                    for i in range(1, num+1)]
+    b = bracket.from_seeds(participants)
+    
+    if mirrored:
+        for e in list(b):
+            if isinstance(e, branchedElement) and rng.random() < 0.5:
+                e._members.reverse()
+        b = bracket.bracket(b.top)
+    
+    return shuffle_leaves(b, rng)
 
 class TestPhases(unittest.TestCase):
     def test_basic_stuff(self):
@@ -49,6 +104,17 @@ class TestPhases(unittest.TestCase):
         self.assertEqual(r2.min_rank(), 1)
         self.assertEqual(r2.max_rank(), 4)
     
+    def test_interned(self):
+        r1 = bracketPhase(participants=10, phase=0)
+        
+        self.assertTrue(r1.shifted(1) is bracketPhase(10, 1))
+        self.assertTrue(r1.shifted_to_top() is bracketPhase(10, -1).shifted(1))
+        self.assertTrue(copy.deepcopy(r1) is r1)
+        self.assertTrue(pickle.loads(pickle.dumps(r1, 2)) is r1)
+        
+        with self.assertRaises(AttributeError):
+            r1._size = 4
+    
 class TestElements(unittest.TestCase):
     def test_list_functions(self):
         # __init__
@@ -225,6 +291,44 @@ class TestElements(unittest.TestCase):
         self.assertEqual(b9.count(), 3)
         self.assertEqual(b4.count(), 5)
         
+    def test_cached_values(self):
+        b1 = rankedElement("one", 1)
+        b2 = rankedElement("two", 2)
+        b3 = rankedElement("three", 3)
+        b4 = rankedElement("four", 4)
+        
+        b5 = branchedElement(b1, b4)
+        b6 = branchedElement(b3, branchedElement(b2, rankedElement("five", 5)))
+        top = branchedElement(b5, b6)
+        
+        self.assertEqual(top.rank(), 1)
+        self.assertEqual(top.count(), 9)
+        self.assertEqual(top.count_ranked(), 5)
+        self.assertEqual(b6.sum_members(), 5)
+        
+        b2.set_rank(7)
+        self.assertEqual(b6.sum_members(), 8)
+        self.assertEqual(b6.rank(), 3)
+        
+        b1.swap(b3)
+        self.assertEqual(b5.rank(), 3)
+        self.assertEqual(b6.rank(), 1)
+        self.assertEqual(top.sum_members(), 4)
+        
+        b5[1] = branchedElement(rankedElement("six", 6), rankedElement("zero", 0))
+        self.assertEqual(top.rank(), 0)
+        self.assertEqual(top.count(), 11)
+        self.assertEqual(top.count_ranked(), 6)
+        
+    def test_slots(self):
+        b = branchedElement(rankedElement("one", 1), rankedElement("two", 2))
+        
+        self.assertFalse(hasattr(b, "__dict__"))
+        self.assertFalse(hasattr(b[0], "__dict__"))
+        
+        with self.assertRaises(AttributeError):
+            b[0].seed = 1
+        
     def test_iter(self):
         composers = ["Ludwig", "Copland", "Bernstein", "Britten", "Schubert", "Chopin"]
     
@@ -255,13 +359,6 @@ class TestElements(unittest.TestCase):
         self.assertEqual(len(elements), 0)
         
 class TestBracket(unittest.TestCase):
-    def generate_bracket(self, num):
-        participants = []
-        for i in range(num):
-            participants.append(rankedElement(str(i), i))
-        
-        random.shuffle(participants)
-    
     def get_bracket(self):
         return getbracket.generate("foobar18-matches.xml", "foobar18-participants.xml")
         
@@ -307,15 +404,673 @@ class TestBracket(unittest.TestCase):
         
         self.assertEqual(ranked_elements, [12,8,9,4,6,3,1,2,15,7,10,5,14,13,11])
     
+    def test_from_seeds(self):
+        self.assertEqual(bracket._seed_order(4), [1, 4, 2, 3])
+
+        for num in [2, 3, 10, 16, 37]:
+            participants = [rankedElement(str(i), i) for i in range(1, num+1)]
+            random.shuffle(participants)
+
+            b = bracket.from_seeds(participants)
+
+            self.assertEqual(b.top.count_ranked(), num)
+            for e in b:
+                self.assertEqual(e.residual(), 0)
+
+        with self.assertRaises(ValueError):
+            bracket.from_seeds([rankedElement("lonely", 1)])
+
+    def test_phase_table(self):
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 11)])
+        
+        self.assertEqual([b.phase(p).size() for p in range(5)], [16, 8, 4, 2, 1])
+        self.assertEqual(b.phase(0).min_rank(), 7)
+        self.assertEqual(b.phase(1).max_rank(), 6)
+        
+        for e in b:
+            self.assertTrue(e.phase is b.phase(e.phase.number()))
+    
+    def test_walk(self):
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 24)])
+        walk = b._walk()
+        
+        self.assertEqual(sum(len(pairs) for pairs in walk.values()), len(list(b)))
+        for (phasenum, count), pairs in walk.items():
+            self.assertEqual([e for (e, par) in pairs], list(b.iter_phase(phasenum, count)))
+            for (e, par) in pairs:
+                self.assertTrue(par is None or e is par[0] or e is par[1])
+        
+        self.assertEqual(list(b.iter_ranked(walk)), list(b.iter_ranked()))
+        self.assertEqual(len(list(b.iter_ranked())), 23)
+    
+    def test_contains(self):
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 20)])
+        elements = list(b)
+        
+        for e in elements:
+            self.assertTrue(e in b)
+        self.assertFalse(rankedElement("outsider", 4) in b)
+        
+        deep = list(b.iter_phase(0))[-1]
+        self.assertEqual(len(list(deep.ancestors())), 5)
+        self.assertTrue(list(deep.ancestors())[-1] is b.top)
+        
+        for e in deep.ancestors():
+            self.assertTrue(e.contains_element(deep))
+            self.assertFalse(deep in e[0] and deep in e[1])
+            with self.assertRaises(ValueError):
+                e.swap(deep._parent)
+        
+        # labels are kept up to date through swaps of the same shape
+        b.top[0][0].swap(b.top[1][1])
+        self.assertTrue(b.top._labels.valid)
+        for e in b:
+            for a in e.ancestors():
+                self.assertTrue(a.contains_element(e))
+                self.assertFalse(e.contains_element(a))
+        
+        # and fall back on parent links when the shape changes
+        b.top[0] = rankedElement("bye", 1)
+        self.assertFalse(b.top._labels.valid)
+        self.assertTrue(b.top[0] in b)
+        self.assertFalse(deep in b)
+    
+    def test_sort_shuffled(self):
+        for num in [8, 32, 128]:
+            b = shuffled_bracket(num)
+            b.sort()
+
+            for e in b:
+                self.assertEqual(e.residual(), 0)
+
+    def test_sort_mirrored(self):
+        # mirrored subtrees share a count, so branch swaps can trade members of either kind
+        for seed in range(12):
+            shuffle = random.Random(seed)
+            for num in [25, 27, 52]:
+                b = shuffled_bracket(num, shuffle, mirrored=True)
+                placed = pickle.loads(pickle.dumps(b, 2))
+                placed.sort(method="assignment")
+                
+                b.sort()
+                
+                self.assertEqual(sorted(e.rank() for e in b.iter_ranked()), range(1, num+1))
+                self.assertTrue(b.total_residual() <= placed.total_residual())
+    
+    @unittest.skipIf(bracket.numpy is None, "NumPy is not installed")
+    def test_sort_vectorized(self):
+        b = shuffled_bracket(64)
+        b.sort(vectorized=True)
+
+        for e in b:
+            self.assertEqual(e.residual(), 0)
+
+    def test_sort_assignment(self):
+        for num in [2, 8, 21, 100]:
+            b = shuffled_bracket(num)
+            b.sort(method="assignment")
+            
+            for e in b:
+                self.assertEqual(e.residual(), 0)
+        
+        # ranks which aren't a permutation are placed in the same order as seeding them
+        ranks = random.sample(range(1000), 21)
+        b = shuffle_leaves(bracket.from_seeds([rankedElement(str(r), r) for r in ranks]))
+        
+        b.sort(method="assignment")
+        seeded = bracket.from_seeds([rankedElement(str(r), r) for r in ranks])
+        self.assertEqual([e.name for e in b.iter_ranked()], [e.name for e in seeded.iter_ranked()])
+        
+        self.assertRaises(ValueError, b.sort, method="bogus")
+    
+    def test_sort_separated(self):
+        def meets_early(b, limit):
+            for e in b:
+                if isinstance(e, branchedElement) and e.phase.number() < limit:
+                    teams = [m.tags["team"] for m in e if isinstance(m, rankedElement)]
+                    if len(teams) != len(set(teams)):
+                        return True
+            return False
+        
+        for num, limit in [(16, 2), (37, 3), (128, 3)]:
+            b = shuffled_bracket(num, team=lambda i: i % (num // 4))
+            
+            b.sort(separate={"team": limit})
+            self.assertFalse(meets_early(b, limit))
+            
+            b.sort(method="assignment", separate=[("team", limit)])
+            self.assertFalse(meets_early(b, limit))
+    
+    def test_sort_stats(self):
+        b = shuffled_bracket(32)
+        
+        swapped = []
+        stats = b.sort(stats=True, on_swap=lambda x, y: swapped.append((x, y)))
+        
+        self.assertEqual(stats["swaps"], len(swapped))
+        self.assertTrue(stats["passes"] >= 1)
+        self.assertTrue(stats["rated"] >= stats["swaps"])
+        self.assertTrue(stats["residual_calls"] > 0 and stats["rank_calls"] > 0)
+        self.assertTrue(stats["time_rankeds"] >= 0 and stats["time_branches"] >= 0)
+        
+        # a sorted bracket needs one pass over the rankeds and one over the branches
+        stats = b.sort(stats=True)
+        self.assertEqual((stats["passes"], stats["swaps"]), (2, 0))
+        self.assertEqual(b.sort(), 0)
+    
+    def test_sort_budget(self):
+        b = shuffled_bracket(256)
+        before = b.total_residual()
+        
+        swapped = []
+        residual = b.sort(max_swaps=10, on_swap=lambda x, y: swapped.append((x, y)))
+        self.assertEqual(len(swapped), 10)
+        self.assertEqual(residual, b.total_residual())
+        self.assertTrue(residual < before)
+        
+        stats = b.sort(deadline=0, stats=True)
+        self.assertTrue(stats["stopped"])
+        self.assertEqual((stats["swaps"], stats["residual"]), (0, residual))
+        
+        stats = b.sort(deadline=60, max_swaps=10**6, stats=True)
+        self.assertFalse(stats["stopped"])
+        self.assertEqual(stats["residual"], 0)
+    
+    def test_add_participant(self):
+        for num in [2, 5, 8, 20]:
+            b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, num+1)])
+            
+            self.assertEqual(b.add_participant(rankedElement("walk-in")), 0)
+            
+            seeded = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, num+2)])
+            self.assertEqual([e.count() for e in b], [e.count() for e in seeded])
+            self.assertEqual(b.total_residual(), 0)
+            self.assertEqual([e.rank() for e in b.iter_ranked() if e.name == "walk-in"], [num+1])
+        
+        shuffle = random.Random(1)
+        for num in [4] + [shuffle.randint(2, 80) for i in range(30)]:
+            b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, num+1)])
+            rank = 1 if num == 4 else shuffle.randint(1, num)
+            b.add_participant(rankedElement("late", rank))
+            
+            self.assertEqual(sorted(e.rank() for e in b.iter_ranked()), range(1, num+2))
+            self.assertEqual([e.rank() for e in b.iter_ranked() if e.name == "late"], [rank])
+            self.assertEqual(b.total_residual(), 0)
+        
+        self.assertRaises(ValueError, b.add_participant, b.top[0])
+    
+    def test_remove_participant(self):
+        for num in [3, 9, 16]:
+            b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, num+1)])
+            last = [e for e in b.iter_ranked() if e.rank() == num][0]
+            
+            self.assertEqual(b.remove_participant(last), 0)
+            
+            seeded = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, num)])
+            self.assertEqual([e.count() for e in b], [e.count() for e in seeded])
+            self.assertEqual(b.total_residual(), 0)
+            self.assertFalse(last in b)
+        
+        shuffle = random.Random(1)
+        for num in [16] + [shuffle.randint(3, 80) for i in range(30)]:
+            b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, num+1)])
+            dropout = shuffle.choice(list(b.iter_ranked()))
+            b.remove_participant(dropout)
+            
+            self.assertEqual(sorted(e.rank() for e in b.iter_ranked()), range(1, num))
+            self.assertFalse(dropout.name in [e.name for e in b.iter_ranked()])
+            self.assertEqual(b.total_residual(), 0)
+        
+        self.assertRaises(ValueError, b.remove_participant, dropout)
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 3)])
+        self.assertRaises(ValueError, b.remove_participant, b.top[0])
+    
+    def test_reseed_separated(self):
+        rules = {"team": 3}
+        
+        def conflicts(b):
+            separation = bracket._separation(b.top, rules)
+            return sum(separation.conflicts(e) for e in b.iter_ranked())
+        
+        shuffle = random.Random(0)
+        b = bracket.from_seeds([rankedElement(str(i), i, team=shuffle.randint(0, 7)) 
+                                for i in range(1, 33)])
+        b.sort(separate=rules)
+        self.assertEqual(conflicts(b), 0)
+        
+        b.remove_participant(list(b.iter_ranked())[5], separate=rules)
+        self.assertEqual(conflicts(b), 0)
+        
+        b.add_participant(rankedElement("late", 3, team=1), separate=rules)
+        self.assertEqual(conflicts(b), 0)
+        self.assertEqual(sorted(e.rank() for e in b.iter_ranked()), range(1, 33))
+    
     def test_really_big_sort(self):
         #print "Testing really big sort..."
         
-        self.generate_bracket(1000)
+        b = shuffled_bracket(1024)
+        b.sort()
+        
+        for e in b:
+            self.assertEqual(e.residual(), 0)
 
-    def test_post(self):
-        #b = self.get_bracket()
-        #getbracket.post_bracket(b, "foobar19")
+class TestGenerate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_generate(self):
+        for num in [2, 7, 16, 45]:
+            participants = [rankedElement("player" + str(i), i) for i in range(1, num+1)]
+            b = bracket.from_seeds(participants)
+            
+            g = getbracket.generate(*write_export(b, self.directory))
+            
+            self.assertEqual([e.name for e in g.iter_ranked()], [e.name for e in b.iter_ranked()])
+            self.assertEqual([e.count() for e in g], [e.count() for e in b])
+            for e in g:
+                self.assertEqual(e.residual(), 0)
+    
+    def test_records(self):
+        b = bracket.from_seeds([rankedElement("player" + str(i), i) for i in range(1, 4)])
+        matchfile, participantfile = write_export(b, self.directory)
+        
+        matches, top = getbracket.read_matches(open(matchfile, "rb"))
+        participants = getbracket.read_participants(participantfile)
+        
+        self.assertEqual(len(matches), 3)
+        self.assertEqual(top.round, 2)
+        self.assertEqual(participants[top.player1_id].seed, 1)
+        self.assertEqual((top.player1_prereq, top.player2_id), (None, None))
+        self.assertEqual(matches[top.player2_prereq].round, 1)
+        self.assertEqual(sorted((p.name, p.seed) for p in participants.values()), 
+                         [("player1", 1), ("player2", 2), ("player3", 3)])
+    
+    def test_generate_json(self):
+        def number(id):
+            return None if id is None else int(id)
+        
+        b = bracket.from_seeds([rankedElement("player" + str(i), i) for i in range(1, 38)])
+        matchfile, participantfile = write_export(b, self.directory)
+        matches, top = getbracket.read_matches(matchfile)
+        
+        match_json = json.dumps([{"match": {"id": int(m.id), "round": m.round, 
+                                            "player1_id": number(m.player1_id), 
+                                            "player2_id": number(m.player2_id),
+                                            "player1_prereq_match_id": number(m.player1_prereq),
+                                            "player2_prereq_match_id": number(m.player2_prereq),
+                                            "state": "open"}}
+                                 for m in sorted(matches.values(), key=lambda m: int(m.id))])
+        participant_json = json.dumps([{"participant": {"id": int(p.id), "name": p.name, 
+                                                        "seed": p.seed}}
+                                       for p in getbracket.read_participants(participantfile).values()])
+        
+        jsonfile = os.path.join(self.directory, "matches.json")
+        with open(jsonfile, "w") as f:
+            f.write(match_json)
+        
+        for g in (getbracket.generate_json(match_json, participant_json),
+                  getbracket.generate_json(jsonfile, io.BytesIO(participant_json))):
+            self.assertEqual([e.name for e in g.iter_ranked()], [e.name for e in b.iter_ranked()])
+            self.assertEqual([e.count() for e in g], [e.count() for e in b])
+    
+    def test_double_elimination(self):
+        def match(id, round, p1=None, p2=None, pre1=None, pre2=None, lose1=False, lose2=False):
+            return {"match": {"id": id, "round": round, "player1_id": p1, "player2_id": p2,
+                              "player1_prereq_match_id": pre1, "player2_prereq_match_id": pre2,
+                              "player1_is_prereq_match_loser": lose1, 
+                              "player2_is_prereq_match_loser": lose2}}
+        
+        matches = json.dumps([match(1, 1, 1, 4), match(2, 1, 2, 3), match(3, 2, pre1=1, pre2=2),
+                              match(4, -1, pre1=1, pre2=2, lose1=True, lose2=True),
+                              match(5, -2, pre1=3, pre2=4, lose1=True),
+                              match(6, 3, pre1=3, pre2=5),
+                              match(7, 3, pre1=6, pre2=6, lose2=True)])
+        participants = json.dumps([{"participant": {"id": i, "name": "player" + str(i), "seed": i}}
+                                   for i in range(1, 5)])
+        
+        graph = getbracket.read_graph_json(matches)
+        
+        self.assertEqual(graph.top.id, "3")
+        self.assertEqual(graph.winners, ["1", "2", "3"])
+        self.assertEqual(graph.losers, ["4", "5"])
+        self.assertEqual(graph.finals, ["6", "7"])
+        self.assertEqual(sorted(graph.drops()), [("4", 1, "1"), ("4", 2, "2"), ("5", 1, "3")])
+        
+        b, elements = graph.tree(getbracket.read_participants_json(participants))
+        self.assertEqual(b.top, elements["3"])
+        self.assertEqual(graph.losers_entries(elements)[("5", 1)], b.top)
+        self.assertEqual([e.name for e in b.iter_ranked()], 
+                         [e.name for e in getbracket.generate_json(matches, participants).iter_ranked()])
+        
+        # a third place match in a single elimination bracket isn't the top
+        matches = json.dumps([match(1, 1, 1, 4), match(2, 1, 2, 3), 
+                              match(4, 2, pre1=1, pre2=2, lose1=True, lose2=True),
+                              match(3, 2, pre1=1, pre2=2)])
+        graph = getbracket.read_graph_json(matches)
+        self.assertEqual(graph.top.id, "3")
+    
+    def test_missing_participant(self):
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 5)])
+        matchfile, participantfile = write_export(b, self.directory)
+        
+        participants = ET.parse(participantfile)
+        root = participants.getroot()
+        root.remove(root[0])
+        participants.write(participantfile)
+        
+        with self.assertRaises(ValueError):
+            getbracket.generate(matchfile, participantfile)
+    
+class challongeStandIn(BaseHTTPServer.BaseHTTPRequestHandler):
+    """A local stand-in for the challonge API, which records every request it gets."""
+    protocol_version = "HTTP/1.1"
+    
+    def handle_request(self):
+        length = int(self.headers.getheader("Content-Length") or 0)
+        body = urlparse.parse_qsl(self.rfile.read(length))
+        self.server.requests.append((self.command, self.path, body, self.client_address))
+        
+        text = self.server.files.get(self.path, "<ok/>")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+    
+    do_GET = do_POST = do_PUT = handle_request
+    
+    def log_message(self, *args):
         pass
+
+class standInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class TestChallonge(unittest.TestCase):
+    def setUp(self):
+        self.server = standInServer(("127.0.0.1", 0), challongeStandIn)
+        self.server.requests = []
+        self.server.files = {}
+        self.api = "http://127.0.0.1:%d/v1" % self.server.server_port
+        
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def test_post(self):
+        b = bracket.from_seeds([rankedElement("player" + str(i), i) for i in range(1, 20)])
+        
+        responses = getbracket.post_bracket(b, "foobar19", key=("user", "key"), api=self.api)
+        
+        self.assertEqual(len(responses), 2)
+        self.assertEqual([r[:2] for r in self.server.requests], 
+                         [("PUT", "/v1/tournaments/foobar19.xml"),
+                          ("POST", "/v1/tournaments/foobar19/participants/bulk_add.xml")])
+        
+        names = [value for (field, value) in self.server.requests[1][2]]
+        self.assertEqual(names, [e.name for e in b.iter_ranked()])
+        
+        # both requests are sent over the same connection
+        self.assertEqual(self.server.requests[0][3], self.server.requests[1][3])
+    
+    def test_save(self):
+        directory = tempfile.mkdtemp()
+        tournaments = ["foobar" + str(i) for i in range(5)]
+        for t in tournaments:
+            for kind in ("matches", "participants"):
+                path = "/v1/tournaments/" + t + "/" + kind + ".xml"
+                self.server.files[path] = "<" + kind + ">" + t + "</" + kind + ">"
+        
+        try:
+            files = getbracket.save_all_xml(tournaments, key=("user", "key"), 
+                                            directory=directory, api=self.api)
+            
+            self.assertEqual(len(self.server.requests), 10)
+            for t, (matchfile, participantfile) in zip(tournaments, files):
+                self.assertEqual(open(matchfile).read(), "<matches>" + t + "</matches>")
+                self.assertEqual(open(participantfile).read(), 
+                                 "<participants>" + t + "</participants>")
+            
+            matchfile = getbracket.save_xml("foobar0", key=("user", "key"), 
+                                            directory=directory, api=self.api)
+            self.assertEqual(matchfile, files[0][0])
+        finally:
+            shutil.rmtree(directory)
+    
+class TestBatchSort(unittest.TestCase):
+    def test_pickle(self):
+        b = shuffled_bracket(21, team=lambda i: i % 4)
+        
+        p = pickle.loads(pickle.dumps(b, 2))
+        
+        self.assertEqual([e.name for e in p.iter_ranked()], [e.name for e in b.iter_ranked()])
+        self.assertEqual([e.tags for e in p.iter_ranked()], [e.tags for e in b.iter_ranked()])
+        self.assertEqual([e.count() for e in p], [e.count() for e in b])
+        self.assertEqual([e.residual() for e in p], [e.residual() for e in b])
+    
+    def test_sort_all(self):
+        directory = tempfile.mkdtemp()
+        
+        try:
+            team = lambda i: i % 4
+            brackets = [shuffled_bracket(num, team=team) for num in [8, 16, 32, 64]]
+            items = brackets[:3] + [write_export(brackets[3], directory)]
+            
+            results = batchsort.sort_all(items, processes=2)
+            
+            self.assertEqual([b.top.count_ranked() for b in results], [8, 16, 32, 64])
+            for b in results:
+                for e in b:
+                    self.assertEqual(e.residual(), 0)
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_sort_all_in_process(self):
+        b = shuffled_bracket(32, team=lambda i: i % 4)
+        participants = [rankedElement(str(i), i) for i in range(1, 12)]
+        residuals = [e.residual() for e in b]
+        
+        # both with one process, and with one item for the default number of processes
+        for results in [batchsort.sort_all([b, participants], processes=1),
+                        batchsort.sort_all([b])]:
+            self.assertFalse(results[0] is b)
+            self.assertEqual(results[0].total_residual(), 0)
+            self.assertEqual([e.residual() for e in b], residuals)
+            self.assertEqual([e._parent for e in participants], [None]*11)
+    
+class TestPools(unittest.TestCase):
+    def test_split(self):
+        participants = [rankedElement(str(i), i) for i in range(1, 2001)]
+        random.shuffle(participants)
+        
+        groups = pools.split(participants, 16)
+        
+        self.assertEqual([g[0].rank() for g in groups], range(1, 17))
+        self.assertEqual(sorted(e.rank() for g in groups for e in g), range(1, 2001))
+        for g in groups:
+            self.assertEqual(len(g), 125)
+        
+        totals = [sum(e.rank() for e in g) for g in groups]
+        self.assertTrue(max(totals) - min(totals) < 16)
+        
+        self.assertRaises(ValueError, pools.split, participants[:7], 4)
+    
+    def test_build_and_merge(self):
+        participants = [rankedElement(str(i), i, team=i % 3) for i in range(1, 43)]
+        
+        groups = pools.build(participants, 4)
+        
+        self.assertEqual([g.top.count_ranked() for g in groups], [11, 11, 10, 10])
+        for g in groups:
+            for e in g:
+                self.assertEqual(e.residual(), 0)
+            for e in g.iter_ranked():
+                self.assertEqual(e.tags["team"], int(e.name) % 3)
+        self.assertEqual(participants[0].rank(), 1)
+        
+        results = [sorted(g.iter_ranked(), key=lambda e: e.rank()) for g in groups]
+        b = pools.merge(results, advance=2)
+        
+        self.assertEqual([e.name for e in sorted(b.iter_ranked(), key=lambda e: e.rank())], 
+                         ["1", "2", "3", "4", "8", "7", "6", "5"])
+        for e in b:
+            self.assertEqual(e.residual(), 0)
+    
+    def test_build_separated(self):
+        participants = [rankedElement(str(i), i, team=i % 3) for i in range(1, 65)]
+        
+        def conflicts(g):
+            return [e for e in g if isinstance(e, branchedElement) and 
+                    isinstance(e[0], rankedElement) and isinstance(e[1], rankedElement) and
+                    e[0].tags["team"] == e[1].tags["team"]]
+        
+        # seeded pools pair some teammates in the first round, which separation undoes
+        self.assertTrue(any(conflicts(g) for g in pools.build(participants, 4)))
+        
+        groups = pools.build(participants, 4, processes=2, separate={"team": 2})
+        
+        self.assertEqual([g.top.count_ranked() for g in groups], [16, 16, 16, 16])
+        for g in groups:
+            self.assertEqual(sorted(e.rank() for e in g.iter_ranked()), range(1, 17))
+            self.assertEqual(conflicts(g), [])
+    
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_round_trip(self):
+        participants = [rankedElement(str(i), i, team=i % 3) for i in range(1, 22)]
+        participants[0].name = u"J\u00f6rg"
+        b = shuffle_leaves(bracket.from_seeds(participants))
+        
+        filename = os.path.join(self.directory, "bracket.snapshot")
+        snapshot.save(b, filename)
+        
+        for use_mmap in (False, True):
+            c = snapshot.load(filename, use_mmap)
+            
+            self.assertEqual([e.name for e in c.iter_ranked()], [e.name for e in b.iter_ranked()])
+            self.assertEqual([e.tags for e in c.iter_ranked()], [e.tags for e in b.iter_ranked()])
+            self.assertEqual([e.count() for e in c], [e.count() for e in b])
+            self.assertEqual([e.residual() for e in c], [e.residual() for e in b])
+        
+        # brackets without tags leave the tag section empty
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 9)])
+        self.assertEqual(snapshot.loads(snapshot.dumps(b)).top.count(), 15)
+    
+    def test_invalid(self):
+        b = bracket.from_seeds([rankedElement(str(i), i) for i in range(1, 9)])
+        data = snapshot.dumps(b)
+        
+        self.assertRaises(ValueError, snapshot.loads, "XXXX" + data[4:])
+        self.assertRaises(ValueError, snapshot.loads, data[:-1])
+        self.assertRaises(ValueError, snapshot.loads, data[:8])
+        
+        # every change to a single byte of the shape breaks the tree
+        start = snapshot._HEADER.size
+        for i in range(15):
+            for byte in ("\x00", "\x01", "\x02"):
+                if byte != data[start + i]:
+                    corrupt = data[:start + i] + byte + data[start + i + 1:]
+                    self.assertRaises(ValueError, snapshot.loads, corrupt)
+    
+class TestLayoutCache(unittest.TestCase):
+    def shuffled_bracket(self, num, prefix, seed):
+        return shuffled_bracket(num, random.Random(seed), prefix, team=lambda i: i % 4)
+    
+    def test_sort(self):
+        cache = layoutcache.layoutCache()
+        
+        a = self.shuffled_bracket(37, "a", 1)
+        self.assertFalse(cache.sort(a))
+        
+        # the same shape and seeding under different names
+        b = self.shuffled_bracket(37, "b", 1)
+        self.assertTrue(cache.sort(b))
+        
+        self.assertEqual([e.name[1:] for e in b.iter_ranked()], [e.name[1:] for e in a.iter_ranked()])
+        self.assertEqual([e.tags for e in b.iter_ranked()], [e.tags for e in a.iter_ranked()])
+        self.assertEqual([e.residual() for e in b], [e.residual() for e in a])
+        
+        # separation rules, and other seeding, are kept apart
+        self.assertFalse(cache.sort(self.shuffled_bracket(37, "c", 1), separate={"team": 2}))
+        self.assertFalse(cache.sort(self.shuffled_bracket(37, "d", 2)))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 3, 3))
+    
+    def test_sort_mirrored(self):
+        # swaps of mirrored branches change the shape, so the cache has to replay them
+        cache = layoutcache.layoutCache()
+        
+        a = shuffled_bracket(52, random.Random(0), "a", mirrored=True)
+        shape = a.flatten()[0]
+        self.assertFalse(cache.sort(a))
+        self.assertNotEqual(a.flatten()[0], shape)
+        
+        b = shuffled_bracket(52, random.Random(0), "b", mirrored=True)
+        self.assertTrue(cache.sort(b))
+        self.assertEqual(b.flatten()[0], a.flatten()[0])
+        self.assertEqual([e.residual() for e in b], [e.residual() for e in a])
+    
+    def test_eviction(self):
+        cache = layoutcache.layoutCache(capacity=2)
+        
+        for seed in [1, 2, 1, 3, 2]:
+            cache.sort(self.shuffled_bracket(16, "", seed))
+        
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 4, 2))
+    
+    def test_save(self):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, "layouts")
+        
+        try:
+            cache = layoutcache.layoutCache(filename=filename)
+            cache.sort(self.shuffled_bracket(16, "", 1))
+            cache.save()
+            
+            cache = layoutcache.layoutCache(filename=filename)
+            self.assertEqual(len(cache), 1)
+            
+            b = self.shuffled_bracket(16, "", 1)
+            self.assertTrue(cache.sort(b))
+            self.assertEqual(b.total_residual(), 0)
+        finally:
+            shutil.rmtree(directory)
+    
+class TestCompactBracket(unittest.TestCase):
+    def test_compact(self):
+        participants = [rankedElement(str(i), i, region=i % 3) for i in range(1, 12)]
+        b = bracket.from_seeds(participants)
+        leaves = [e for e in b if isinstance(e, rankedElement)]
+        leaves[0].swap(leaves[5])
+        
+        c = compactbracket.compactBracket(b)
+        
+        self.assertEqual([e.rank() for e in c], [e.rank() for e in b])
+        self.assertEqual([e.count() for e in c], [e.count() for e in b])
+        self.assertEqual([e.residual() for e in c], [e.residual() for e in b])
+        self.assertEqual([e.name for e in c.iter_ranked()], [e.name for e in b.iter_ranked()])
+        self.assertEqual([e.rank() for e in c.iter_phase(2, 0)], 
+                         [e.rank() for e in b.iter_phase(2, 0)])
+        self.assertEqual(c.top[0].count(), b.top[0].count())
+        
+        # branched elements have no name or tags, as in the bracket
+        self.assertRaises(AttributeError, getattr, c.top, "name")
+        self.assertRaises(AttributeError, getattr, c.top, "tags")
+        self.assertFalse(hasattr(b.top, "name"))
+        self.assertTrue(str(c.top).startswith("<"))
+        
+        d = c.expand()
+        self.assertEqual([e.name for e in d.iter_ranked()], [e.name for e in b.iter_ranked()])
+        self.assertEqual([e.tags for e in d.iter_ranked()], [e.tags for e in b.iter_ranked()])
         
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file